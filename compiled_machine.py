@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""Thread-safe Enigma machines: an immutable definition and cursors.
+
+An EnigmaMachine keeps its wiring and its rotor positions in the same Rotor
+objects, and turning a rotor rewrites them, so one machine can't be used by
+two threads at once. Here the two are split:
+
+    * CompiledMachine is the machine definition: rotor tables, notches,
+      ring settings, reflector and plugboard, all built when it is created.
+      It can't be changed afterwards. Its tables are those of a
+      TrialDecryptor, which holds only tuples and is never written to once
+      made. CompiledMachine.shared reuses a machine for a configuration
+      already in use, and machines with the same two left-hand rotors and
+      reflector share one table of stack reflections.
+    * Cursor is one user's rotor positions and is cheap to create. Each
+      thread uses its own cursors.
+
+So any number of threads can encrypt with one CompiledMachine at the same
+time. This holds under free-threaded CPython (3.13 and later, built without
+the GIL) as well as with the GIL, as the shared objects are only ever read.
+A threaded server can therefore encrypt on every core from a single copy of
+the tables, without pickling anything to worker processes. A single Cursor
+is not safe to use from two threads at once.
+
+Example:
+    machine = CompiledMachine(['I', 'II', 'III'], 'ABC', 'B', 'AM FI')
+    # In each thread:
+    cursor = machine.cursor('DEF')
+    cursor.encrypt_message('HELLO')
+"""
+
+import threading
+from weakref import WeakValueDictionary
+
+from key_search import (TrialDecryptor, fill_letters, message_numbers,
+                        numbers_to_text, text_to_numbers)
+
+# Most tables of stack reflections kept for reuse by new machines, about
+# 17.5 KB each.
+MAX_STACK_TABLES = 256
+
+# Tables of stack reflections by left and middle rotor types and reflector,
+# oldest first, see _stack_table.
+_STACK_TABLES = {}
+_STACK_TABLES_LOCK = threading.Lock()
+
+
+def _stack_table(decryptor, reflector_mapping):
+    """
+    The reflection of a three rotor machine for every left and middle rotor
+    offset, as a 17,576 byte table as in shared_tables. It only depends on
+    the two left-hand rotor types and the reflector, so it is built once for
+    them and shared by every machine that has them.
+    """
+    key = (decryptor.rotor_types[:2], reflector_mapping.upper())
+    stack = _STACK_TABLES.get(key)
+    if stack is None:
+        stack = b''.join(
+            bytes(decryptor.stack_reflection([left, middle, 0], [0] * 3))
+            for left in range(26) for middle in range(26))
+        with _STACK_TABLES_LOCK:
+            if key not in _STACK_TABLES and \
+               len(_STACK_TABLES) >= MAX_STACK_TABLES:
+                del _STACK_TABLES[next(iter(_STACK_TABLES))]
+            _STACK_TABLES[key] = stack
+
+    return stack
+
+
+class CompiledMachine:
+    """
+    A class to represent an immutable Enigma Machine definition, safe to
+    share between threads.
+
+    Attributes:
+        rotor_types: (tuple)
+            Types of rotor in the machine, left-most first.
+        ring_settings: (str)
+            Ring settings of the rotors.
+        reflector_mapping: (str)
+            Reflector, as for EnigmaMachine.
+        steckered_pairing: (str)
+            Plugboard, as for EnigmaMachine.
+        notches: (tuple)
+            Notch position numbers of the rotors.
+    """
+    __slots__ = ('rotor_types', 'ring_settings', 'reflector_mapping',
+                 'steckered_pairing', 'notches', '_rings', '_decryptor',
+                 '_stack', '__weakref__')
+
+    # Machines by configuration, see shared.
+    _shared = WeakValueDictionary()
+
+    def __init__(self, rotor_types, ring_settings, reflector_mapping='B',
+                 steckered_pairing=''):
+        """
+        Builds every table the machine needs.
+        Args:
+            rotor_types (lst): List of types of rotor in the machine.
+            ring_settings (str): Ring settings of the rotors.
+            reflector_mapping (str): As for EnigmaMachine. A Greek rotor is
+                                     given as a folded reflector, see
+                                     key_search.folded_reflectors.
+            steckered_pairing (str): As for EnigmaMachine.
+
+        Raises:
+            ValueError if any of the settings are invalid.
+        """
+        decryptor = TrialDecryptor(rotor_types, reflector_mapping,
+                                   steckered_pairing)
+        rings = text_to_numbers(ring_settings)
+        if len(rings) != len(rotor_types) or \
+           len(ring_settings) != len(rotor_types):
+            raise ValueError('Number of ring settings must match with number '
+                             'of rotors')
+        setattr_ = super().__setattr__
+        setattr_('rotor_types', tuple(rotor_types))
+        setattr_('ring_settings', ring_settings.upper())
+        setattr_('reflector_mapping', reflector_mapping)
+        setattr_('steckered_pairing', steckered_pairing or '')
+        setattr_('notches', tuple(decryptor.notches))
+        setattr_('_rings', tuple(rings))
+        setattr_('_decryptor', decryptor)
+        # With three rotors the reflection for every left and middle rotor
+        # offset is looked up rather than composed.
+        stack = None
+        if len(rotor_types) == 3:
+            stack = _stack_table(decryptor, reflector_mapping)
+        setattr_('_stack', stack)
+
+    @classmethod
+    def shared(cls, rotor_types, ring_settings, reflector_mapping='B',
+               steckered_pairing=''):
+        """
+        Gets the machine for a configuration, reusing an existing one if
+        anything still uses it.
+        """
+        key = (tuple(rotor_types), ring_settings.upper(),
+               reflector_mapping.upper(), steckered_pairing or '')
+        machine = cls._shared.get(key)
+        if machine is None:
+            machine = cls(*key)
+            cls._shared[key] = machine
+
+        return machine
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledMachine is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('CompiledMachine is immutable')
+
+    def __repr__(self):
+        return (f'CompiledMachine(rotor_types={list(self.rotor_types)}, '
+                f'ring_settings={self.ring_settings!r}, '
+                f'reflector_mapping={self.reflector_mapping!r}, '
+                f'steckered_pairing={self.steckered_pairing!r})')
+
+    def reflection(self, positions):
+        """
+        The reflection seen from the right-most rotor, i.e. through every
+        other rotor and the reflector, at the given rotor position numbers.
+        """
+        if self._stack is not None:
+            start = (((positions[0] - self._rings[0]) % 26) * 26
+                     + (positions[1] - self._rings[1]) % 26) * 26
+            return self._stack[start:start + 26]
+        return self._decryptor.stack_reflection(positions, self._rings)
+
+    def cursor(self, rotor_positions):
+        """
+        A new Cursor on this machine at the given rotor positions.
+        """
+        return Cursor(self, rotor_positions)
+
+    def encrypt(self, message, rotor_positions):
+        """
+        Encrypts a message with a cursor of its own.
+
+        Returns:
+            encrypted_message (str): The encrypted message.
+            rotor_positions (str): The final rotor positions.
+        """
+        cursor = Cursor(self, rotor_positions)
+        return cursor.encrypt_message(message), cursor.rotor_positions
+
+
+class Cursor:
+    """
+    A class to represent the rotor state of one use of a CompiledMachine.
+    Only the thread using a cursor may touch it.
+
+    Attributes:
+        machine: (CompiledMachine)
+            The machine definition.
+    """
+    __slots__ = ('machine', '_positions')
+
+    def __init__(self, machine, rotor_positions):
+        """
+        Initialises a Cursor.
+        Args:
+            machine (CompiledMachine): The machine definition.
+            rotor_positions (str): Initial positions of the rotors.
+
+        Raises:
+            ValueError if the number of positions doesn't match the machine.
+        """
+        positions = text_to_numbers(rotor_positions)
+        if len(positions) != len(machine.rotor_types) or \
+           len(rotor_positions) != len(machine.rotor_types):
+            raise ValueError('Number of rotor positions must match with '
+                             'number of rotors')
+        self.machine = machine
+        self._positions = positions
+
+    @property
+    def rotor_positions(self):
+        """
+        The current rotor positions as a string.
+        """
+        return numbers_to_text(self._positions)
+
+    @rotor_positions.setter
+    def rotor_positions(self, rotor_positions):
+        """
+        Moves the rotors by hand.
+        """
+        positions = text_to_numbers(rotor_positions)
+        if len(positions) != len(self._positions) or \
+           len(rotor_positions) != len(self._positions):
+            raise ValueError('Number of rotor positions must match with '
+                             'number of rotors')
+        self._positions = positions
+
+    def encrypt_message(self, message):
+        """
+        Encrypts a message, turning the cursor's rotors as it goes. Like
+        EnigmaMachine.encrypt_message it skips any characters that aren't
+        letters.
+
+        Raises:
+            ValueError if the message is not a string or contains letters
+            other than A to Z.
+        """
+        if type(message) != str:
+            raise ValueError
+        machine = self.machine
+        encrypted = machine._decryptor.decrypt(
+            message_numbers(message), self._positions, machine._rings,
+            machine.reflection)
+
+        return fill_letters(message, encrypted)
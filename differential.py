@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+"""Differential testing of the Enigma Machine engines.
+
+Random machine configurations and messages are run through the reference
+object-by-object implementation (the current passes through each Rotor,
+Reflector and Plugboard in turn, exactly as described in enigma_machine.py)
+and through every registered engine. Any engine whose output or final rotor
+positions differ from the reference is reported along with a shrunk, minimal
+configuration that reproduces the difference.
+
+Ran as a script it fuzzes the engines with as many cases as requested.
+
+Example:
+    $ python differential.py --cases 200000 --seed 7 --jobs 4
+"""
+
+import argparse
+import atexit
+import os
+import random
+import string
+import tempfile
+from collections import namedtuple
+from itertools import permutations
+from multiprocessing import Pool, current_process
+
+from compiled_machine import CompiledMachine
+from enigma_machine import GREEK_ROTOR_TYPES, EnigmaMachine
+from key_search import TrialDecryptor
+from random_access import RandomAccessReader, build_index
+from sessions import MachineWiring, Session, SessionStore
+from shared_tables import SharedTablePool, SharedTables
+
+ROTOR_TYPES = ['I', 'II', 'III', 'IV', 'V']
+REFLECTORS = ['A', 'B', 'C']
+THIN_REFLECTORS = ['B-thin', 'C-thin']
+# Characters that don't turn the rotors but must be passed through unchanged.
+PUNCTUATION = ' .,!?\'"-:;()0123456789\n'
+
+Case = namedtuple('Case', ['rotor_types', 'rotor_positions', 'ring_settings',
+                           'reflector_mapping', 'steckered_pairing',
+                           'message'])
+
+# Registered engines, see register_engine.
+ENGINES = {}
+
+
+def register_engine(name, engine):
+    """
+    Adds an engine to be checked against the reference implementation.
+
+    Arguments:
+        name (str): Name the engine is reported under.
+        engine (callable): Takes a list of Case objects and returns a list
+                           with a (output, rotor_positions) tuple for each
+                           case, where output is the encrypted message and
+                           rotor_positions a string of the final rotor
+                           positions. Engines are given cases in batches so
+                           that batched and parallel engines can be checked
+                           efficiently.
+    """
+    ENGINES[name] = engine
+
+
+def build_machine(case):
+    """
+    Builds an EnigmaMachine configured as described by a case.
+    """
+    return EnigmaMachine(rotor_types=list(case.rotor_types),
+                         rotor_positions=case.rotor_positions,
+                         ring_settings=case.ring_settings,
+                         reflector_mapping=case.reflector_mapping,
+                         steckered_pairing=case.steckered_pairing)
+
+
+def final_positions(machine):
+    """
+    The rotor positions of a machine as a single upper case string,
+    including any Greek rotor.
+    """
+    rotors = machine.rotors
+    if machine.greek_rotor is not None:
+        rotors = [machine.greek_rotor] + rotors
+    return ''.join(rotor.position for rotor in rotors).upper()
+
+
+def reference_encrypt(case):
+    """
+    Encrypts a case's message by passing each letter through every part of
+    the machine object by object. This is the behaviour all engines are
+    checked against.
+
+    Returns:
+        result (tuple): The encrypted message and the final rotor positions.
+    """
+    machine = build_machine(case)
+    # The machine's reflector has any Greek rotor folded into it, so the
+    # current is passed through the Greek rotor and the unfolded reflector
+    # separately instead.
+    greek_rotor = machine.greek_rotor
+    reflector = machine.reflector
+    if greek_rotor is not None:
+        reflector = EnigmaMachine.Reflector(case.reflector_mapping)
+    encrypted_message = ''
+    for letter in case.message:
+        if not letter.isalpha():
+            encrypted_message = encrypted_message + letter
+            continue
+        machine.turn_rotor_assembly()
+        encrypted_letter = machine.plugboard.map_letter(letter)
+        for rotor in reversed(machine.rotors):
+            encrypted_letter = rotor.map_letter(encrypted_letter)
+        if greek_rotor is not None:
+            encrypted_letter = greek_rotor.map_letter(encrypted_letter)
+        encrypted_letter = reflector.map_letter(encrypted_letter)
+        if greek_rotor is not None:
+            encrypted_letter = greek_rotor.map_letter(encrypted_letter,
+                                                      reverse=True)
+        for rotor in machine.rotors:
+            encrypted_letter = rotor.map_letter(encrypted_letter,
+                                                reverse=True)
+        encrypted_letter = machine.plugboard.map_letter(encrypted_letter)
+        encrypted_message = encrypted_message + encrypted_letter
+
+    return encrypted_message, final_positions(machine)
+
+
+def fold_greek_rotor(case):
+    """
+    The three rotor equivalent of a four rotor naval case: the Greek rotor
+    is folded into the thin reflector, as key_search.folded_reflectors does.
+
+    Returns:
+        case (Case): The case without its Greek rotor, and with the folded
+                     reflector mapping. Other cases are returned unchanged.
+        greek_position (str): The Greek rotor's position, which never
+                              changes, or '' if there isn't one.
+    """
+    if not case.rotor_types or case.rotor_types[0] not in GREEK_ROTOR_TYPES:
+        return case, ''
+    greek_rotor = EnigmaMachine.Rotor(case.rotor_types[0],
+                                      case.rotor_positions[0],
+                                      case.ring_settings[0])
+    reflector_mapping = EnigmaMachine.Reflector(
+        case.reflector_mapping, greek_rotor).reflector_mapping
+    folded = case._replace(rotor_types=case.rotor_types[1:],
+                           rotor_positions=case.rotor_positions[1:],
+                           ring_settings=case.ring_settings[1:],
+                           reflector_mapping=reflector_mapping)
+
+    return folded, case.rotor_positions[0].upper()
+
+
+def _folding(engine):
+    """
+    Wraps an engine that only takes folded reflectors so that it can be
+    given four rotor naval cases too.
+    """
+    def folding_engine(cases):
+        folded = [fold_greek_rotor(case) for case in cases]
+        results = engine([case for case, _ in folded])
+        return [(output, greek_position + positions)
+                for (output, positions), (_, greek_position)
+                in zip(results, folded)]
+
+    return folding_engine
+
+
+def _press_key_engine(cases):
+    """
+    Engine pressing each key of the message on an EnigmaMachine.
+    """
+    results = []
+    for case in cases:
+        machine = build_machine(case)
+        output = ''.join(machine.press_key(letter) if letter.isalpha()
+                         else letter for letter in case.message)
+        results.append((output, final_positions(machine)))
+
+    return results
+
+
+def _encrypt_message_engine(cases):
+    """
+    Engine encrypting the whole message with EnigmaMachine.encrypt_message.
+    """
+    results = []
+    for case in cases:
+        machine = build_machine(case)
+        output = machine.encrypt_message(case.message)
+        results.append((output, final_positions(machine)))
+
+    return results
+
+
+def _trial_decrypt_engine(cases):
+    """
+    Engine decrypting with the key search's integer-only TrialDecryptor.
+    """
+    results = []
+    for case in cases:
+        decryptor = TrialDecryptor(case.rotor_types, case.reflector_mapping,
+                                   case.steckered_pairing)
+        results.append(decryptor.decrypt_message(
+            case.message, case.rotor_positions, case.ring_settings))
+
+    return results
+
+
+def _compiled_machine_engine(cases):
+    """
+    Engine encrypting with a CompiledMachine cursor, setting its rotor
+    positions by hand half way through so its reflection is worked out
+    afresh.
+    """
+    results = []
+    for case in cases:
+        machine = CompiledMachine.shared(case.rotor_types, case.ring_settings,
+                                         case.reflector_mapping,
+                                         case.steckered_pairing)
+        cursor = machine.cursor(case.rotor_positions)
+        half = len(case.message) // 2
+        output = cursor.encrypt_message(case.message[:half])
+        cursor.rotor_positions = cursor.rotor_positions
+        output += cursor.encrypt_message(case.message[half:])
+        results.append((output, cursor.rotor_positions))
+
+    return results
+
+
+def _session_engine(cases):
+    """
+    Engine encrypting with a compact Session, one letter at a time so the
+    packed rotor state is round-tripped between every key press.
+    """
+    results = []
+    for case in cases:
+        session = Session(MachineWiring.shared(
+            case.rotor_types, case.ring_settings, case.reflector_mapping,
+            case.steckered_pairing), case.rotor_positions)
+        output = ''.join(session.encrypt_message(letter)
+                         for letter in case.message)
+        results.append((output, session.rotor_positions))
+
+    return results
+
+
+def _session_store_engine(cases):
+    """
+    Engine encrypting with sessions packed into SessionStores, adding the
+    whole batch before encrypting any of it.
+    """
+    stores = {}
+    session_ids = []
+    for case in cases:
+        num_rotors = len(case.rotor_types)
+        store = stores.setdefault(num_rotors, SessionStore(num_rotors))
+        session_ids.append(store.add(MachineWiring.shared(
+            case.rotor_types, case.ring_settings, case.reflector_mapping,
+            case.steckered_pairing), case.rotor_positions))
+    results = []
+    for case, session_id in zip(cases, session_ids):
+        store = stores[len(case.rotor_types)]
+        output = store.encrypt_message(session_id, case.message)
+        results.append((output, store.rotor_positions(session_id)))
+
+    return results
+
+
+def _random_access_engine(cases):
+    """
+    Engine writing each message to a file, indexing it with small blocks and
+    decrypting it as random sub-ranges with a RandomAccessReader, so the
+    rotor positions are worked out afresh at each range's start. Ranges and
+    block sizes are seeded from the case, so shrinking is repeatable.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for number, case in enumerate(cases):
+            path = os.path.join(directory, f'{number}.txt')
+            with open(path, 'wb') as data_file:
+                data_file.write(case.message.encode('ascii'))
+            rng = random.Random(repr(case))
+            build_index(path, block_size=rng.randint(1, 16))
+            with RandomAccessReader(path, case.rotor_types,
+                                    case.rotor_positions, case.ring_settings,
+                                    case.reflector_mapping,
+                                    case.steckered_pairing) as reader:
+                cuts = sorted(rng.randint(0, reader.size)
+                              for _ in range(rng.randint(0, 4)))
+                bounds = [0] + cuts + [reader.size]
+                output = ''.join(reader.decrypt_range(start, stop)
+                                 for start, stop in zip(bounds, bounds[1:]))
+                results.append((output,
+                                reader.rotor_positions_at(reader.size)))
+
+    return results
+
+
+# Shared tables and pool for the shared_tables engine, created on first use,
+# by id of the process that created them. Forked workers inherit the parent's
+# entry but must neither use nor close it.
+_shared = {}
+
+
+def _shared_tables_engine(cases):
+    """
+    Engine encrypting with a process pool reading shared memory tables.
+    Reflection tables are only built for some rotor orders so that both
+    ways of finding the reflection are checked. Pool workers can't start
+    processes of their own, so inside one the tables are read in-process.
+    """
+    shared = _shared.get(os.getpid())
+    if shared is None:
+        shared = _shared[os.getpid()] = {}
+        shared['tables'] = SharedTables(
+            rotor_orders=permutations(['I', 'II', 'III'], 3))
+        if not current_process().daemon:
+            shared['pool'] = SharedTablePool(shared['tables'], processes=2)
+        atexit.register(_close_shared)
+    if 'pool' in shared:
+        return shared['pool'].encrypt_messages(cases)
+
+    view = shared['tables'].view()
+    return [view.encrypt(case) for case in cases]
+
+
+def _close_shared():
+    """
+    Stops the shared_tables engine's pool and removes its tables, if this
+    process created them.
+    """
+    shared = _shared.pop(os.getpid(), {})
+    if 'pool' in shared:
+        shared['pool'].close()
+    if 'tables' in shared:
+        shared['tables'].close()
+
+
+register_engine('press_key', _press_key_engine)
+register_engine('encrypt_message', _encrypt_message_engine)
+# The remaining engines take a Greek rotor as a folded reflector.
+register_engine('trial_decrypt', _folding(_trial_decrypt_engine))
+register_engine('compiled_machine', _folding(_compiled_machine_engine))
+register_engine('session', _folding(_session_engine))
+register_engine('session_store', _folding(_session_store_engine))
+register_engine('shared_tables', _folding(_shared_tables_engine))
+register_engine('random_access', _folding(_random_access_engine))
+
+
+def random_letters(rng, length):
+    """
+    A string of random upper case letters.
+    """
+    return ''.join(rng.choice(string.ascii_uppercase) for _ in range(length))
+
+
+def random_case(rng, max_rotors=8, max_length=60):
+    """
+    Generates a random machine configuration and message.
+
+    Three rotor machines and short messages are the most common, but any
+    number of rotors up to max_rotors can be generated, and some machines
+    are four rotor naval ones, with a Greek rotor and a thin reflector.
+    Positions are often chosen close to a rotor's notch so that turnovers
+    and double steps are exercised early in the message.
+
+    Arguments:
+        rng (random.Random): Source of randomness.
+        max_rotors (int): Largest number of rotors to generate.
+        max_length (int): Longest message to generate.
+
+    Returns:
+        case (Case): The generated case.
+    """
+    if rng.random() < 0.6:
+        num_rotors = min(3, max_rotors)
+    else:
+        num_rotors = rng.randint(1, max_rotors)
+    rotor_types = tuple(rng.choice(ROTOR_TYPES) for _ in range(num_rotors))
+    reflector_mapping = rng.choice(REFLECTORS)
+    if num_rotors < max_rotors and rng.random() < 0.2:
+        rotor_types = (rng.choice(GREEK_ROTOR_TYPES),) + rotor_types
+        reflector_mapping = rng.choice(THIN_REFLECTORS)
+        num_rotors += 1
+
+    rotor_positions = ''
+    for rotor_type in rotor_types:
+        if rotor_type in GREEK_ROTOR_TYPES:
+            # A Greek rotor has no notch.
+            position = rng.choice(string.ascii_uppercase)
+        elif rng.random() < 0.5:
+            # Somewhere just before the notch.
+            notch = EnigmaMachine.Rotor(rotor_type).notch
+            position = EnigmaMachine.caeser_shift(notch, -rng.randint(0, 3))
+        else:
+            position = rng.choice(string.ascii_uppercase)
+        rotor_positions = rotor_positions + position
+    ring_settings = random_letters(rng, num_rotors)
+
+    letters = rng.sample(string.ascii_uppercase, 2 * rng.randint(0, 13))
+    steckered_pairing = ' '.join(letters[i] + letters[i + 1]
+                                 for i in range(0, len(letters), 2))
+
+    length = min(int(rng.expovariate(1 / 15)), max_length)
+    alphabet = string.ascii_letters + PUNCTUATION
+    message = ''
+    for _ in range(length):
+        if rng.random() < 0.8:
+            message = message + rng.choice(string.ascii_uppercase)
+        else:
+            message = message + rng.choice(alphabet)
+
+    return Case(rotor_types, rotor_positions, ring_settings,
+                reflector_mapping, steckered_pairing, message)
+
+
+def _run_engine(engine, cases):
+    """
+    Runs a batch of cases through an engine. If the batch fails as a whole
+    then the cases are retried one at a time so that an exception is only
+    blamed on the case that caused it. Any exception an engine raises is
+    recorded as its result for the case, so it shows up as a mismatch.
+    """
+    try:
+        return list(engine(cases))
+    except Exception:
+        pass
+    results = []
+    for case in cases:
+        try:
+            results.append(engine([case])[0])
+        except Exception as err:
+            results.append(('raised', repr(err)))
+
+    return results
+
+
+def find_mismatches(cases, engines=None):
+    """
+    Runs a batch of cases through the reference implementation and each
+    engine.
+
+    Arguments:
+        cases (lst): List of Case objects.
+        engines (dict): Engines to check, by name. Defaults to every
+                        registered engine.
+
+    Returns:
+        mismatches (lst): List of (case, engine_name, expected, actual)
+                          tuples, one for each disagreement found.
+    """
+    if engines is None:
+        engines = ENGINES
+    expected = [reference_encrypt(case) for case in cases]
+    mismatches = []
+    for name, engine in engines.items():
+        actual = _run_engine(engine, cases)
+        for i, case in enumerate(cases):
+            if actual[i] != expected[i]:
+                mismatches.append((case, name, expected[i], actual[i]))
+
+    return mismatches
+
+
+def _fails(case, engine):
+    """
+    Whether an engine disagrees with the reference on a single case. Cases
+    the reference itself rejects (as shrinking can produce) never fail.
+    """
+    try:
+        reference_encrypt(case)
+    except Exception:
+        return False
+
+    return bool(find_mismatches([case], {'engine': engine}))
+
+
+def _candidates(case):
+    """
+    Smaller variations of a case, roughly largest reductions first.
+    """
+    message = case.message
+    # Remove chunks of the message, halving the chunk size each time.
+    chunk = len(message) // 2
+    while chunk >= 1:
+        for start in range(0, len(message), chunk):
+            yield case._replace(message=message[:start]
+                                + message[start + chunk:])
+        chunk = chunk // 2
+    # Drop single rotors.
+    for i in range(len(case.rotor_types)):
+        if len(case.rotor_types) > 1:
+            yield case._replace(
+                rotor_types=case.rotor_types[:i] + case.rotor_types[i + 1:],
+                rotor_positions=(case.rotor_positions[:i]
+                                 + case.rotor_positions[i + 1:]),
+                ring_settings=(case.ring_settings[:i]
+                               + case.ring_settings[i + 1:]))
+    # Remove plugboard pairs.
+    pairs = case.steckered_pairing.split()
+    for i in range(len(pairs)):
+        yield case._replace(
+            steckered_pairing=' '.join(pairs[:i] + pairs[i + 1:]))
+    # Simplify the remaining settings.
+    for i in range(len(case.rotor_types)):
+        if case.rotor_types[i] != 'I':
+            yield case._replace(rotor_types=(case.rotor_types[:i] + ('I',)
+                                             + case.rotor_types[i + 1:]))
+        for field in ['rotor_positions', 'ring_settings']:
+            settings = getattr(case, field)
+            if settings[i] != 'A':
+                yield case._replace(**{field: (settings[:i] + 'A'
+                                               + settings[i + 1:])})
+    if case.reflector_mapping != 'B':
+        yield case._replace(reflector_mapping='B')
+    # Replace message characters with 'A'.
+    for i in range(len(message)):
+        if message[i] != 'A':
+            yield case._replace(message=message[:i] + 'A' + message[i + 1:])
+
+
+def shrink(case, engine):
+    """
+    Shrinks a case on which an engine disagrees with the reference to a
+    minimal case that still disagrees. The message is shortened, rotors and
+    plugboard pairs removed and the remaining settings simplified for as
+    long as the engine keeps failing.
+
+    Arguments:
+        case (Case): Case the engine fails on.
+        engine (callable): The failing engine.
+
+    Returns:
+        case (Case): A smallest failing case found.
+    """
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for candidate in _candidates(case):
+            if _fails(candidate, engine):
+                case = candidate
+                shrunk = True
+                break
+
+    return case
+
+
+def _fuzz_chunk(args):
+    """
+    Fuzzes a chunk of case numbers. Each case is generated from its own
+    seed so results do not depend on how cases are split between workers.
+    """
+    seed, start, stop, batch_size, max_rotors, max_length = args
+    failures = []
+    try:
+        for batch_start in range(start, stop, batch_size):
+            cases = [random_case(random.Random(f'{seed}-{i}'), max_rotors,
+                                 max_length)
+                     for i in range(batch_start, min(batch_start + batch_size,
+                                                     stop))]
+            failures.extend((case, name) for case, name, _, _
+                            in find_mismatches(cases))
+    finally:
+        if current_process().daemon:
+            # Worker processes exit without running atexit handlers.
+            _close_shared()
+
+    return failures
+
+
+def fuzz(num_cases, seed=0, jobs=1, batch_size=256, max_rotors=8,
+         max_length=60):
+    """
+    Checks every registered engine against the reference implementation on
+    randomly generated cases.
+
+    Arguments:
+        num_cases (int): Number of cases to generate.
+        seed (int): Seed for case generation. The same seed always generates
+                    the same cases.
+        jobs (int): Number of worker processes to spread cases over.
+        batch_size (int): Number of cases given to an engine at once.
+        max_rotors (int): Largest number of rotors to generate.
+        max_length (int): Longest message to generate.
+
+    Returns:
+        failures (lst): List of (engine_name, shrunk_case) tuples, one for
+                        each engine that disagreed, with the smallest case
+                        found that reproduces the disagreement.
+    """
+    # At least one case per chunk, so no cases means no chunks.
+    chunk_size = max(-(-num_cases // jobs), 1)
+    chunks = [(seed, start, min(start + chunk_size, num_cases), batch_size,
+               max_rotors, max_length)
+              for start in range(0, num_cases, chunk_size)]
+    if jobs > 1:
+        with Pool(jobs) as pool:
+            results = pool.map(_fuzz_chunk, chunks)
+    else:
+        results = [_fuzz_chunk(chunk) for chunk in chunks]
+
+    failures = {}
+    for case, name in (failure for result in results for failure in result):
+        # One reproducer per engine is enough.
+        if name not in failures:
+            failures[name] = shrink(case, ENGINES[name])
+
+    return sorted(failures.items())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Check the Enigma engines against the reference.')
+    parser.add_argument('--cases', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--max-rotors', type=int, default=8)
+    parser.add_argument('--max-length', type=int, default=60)
+    args = parser.parse_args()
+
+    failures = fuzz(args.cases, seed=args.seed, jobs=args.jobs,
+                    max_rotors=args.max_rotors, max_length=args.max_length)
+    for name, case in failures:
+        print(f'Engine "{name}" disagrees with the reference on: {case}')
+    if failures:
+        raise SystemExit(1)
+    print(f'All {len(ENGINES)} engines agree on {args.cases} cases.')
@@ -10,6 +10,12 @@ their own Enigma Machine.
 import string
 from time import sleep
 
+# Rotors of the four rotor naval machine (M4) that sit between the right-most
+# rotors and a thin reflector and never turn.
+GREEK_ROTOR_TYPES = ('Beta', 'Gamma')
+# Reflectors of the four rotor naval machine, only used with a Greek rotor.
+THIN_REFLECTORS = ('B-thin', 'C-thin')
+
 
 class EnigmaMachine:
     """
@@ -26,6 +32,12 @@ class EnigmaMachine:
         Plugboard object
     reflector : EnigmaMachine.Reflector()
         Reflector object
+    greek_rotor : EnigmaMachine.Rotor()
+        Greek rotor of a four rotor naval machine, or None. It never turns,
+        so it is folded into the reflector rather than kept with the rotors.
+        It is folded in once, when the machine is made, so changing its
+        position or ring setting afterwards has no effect on encryption;
+        make a new machine instead.
     """
     def __init__(self,
                  # Default settings for Enigma Mk I.
@@ -37,11 +49,14 @@ class EnigmaMachine:
         """
         Initialises an EnigmaMachine with rotors, reflector and plugboard.
         Args:
-            rotor_types (lst): List of types of rotor in the machine
+            rotor_types (lst): List of types of rotor in the machine. For
+                               a four rotor naval machine the left-most is
+                               a Greek rotor ('Beta' or 'Gamma').
             rotor_positions (str): Initial positions of the rotors
             ring_settings (str): Ring settings of the rotors
             reflector_mapping (str): Requesite information to initialise a
-                                     EnigmaMachine.Reflector object
+                                     EnigmaMachine.Reflector object ('B-thin'
+                                     or 'C-thin' for a naval machine)
             steckered_pairing (str): Requesite information to initialise a
                                      EnigmaMachine.Plugboard object. If False
                                      then plugboard is set at ""
@@ -54,17 +69,50 @@ class EnigmaMachine:
         elif len(rotor_types) != len(rotor_positions):
             raise ValueError('Number of rotor positions must match with '
                              'number of rotors')
+        # Only the left-most rotor can be a Greek rotor. It is set up like
+        # any other rotor and folded into the reflector.
+        self.greek_rotor = None
+        if len(rotor_types) and rotor_types[0] in GREEK_ROTOR_TYPES:
+            self.greek_rotor = EnigmaMachine.Rotor(
+                rotor_type=rotor_types[0],
+                position=rotor_positions[0],
+                ring_setting=ring_settings[0])
+            rotor_types = rotor_types[1:]
+            rotor_positions = rotor_positions[1:]
+            ring_settings = ring_settings[1:]
+        if any(rotor_type in GREEK_ROTOR_TYPES for rotor_type in rotor_types):
+            raise ValueError('A Greek rotor can only be the left-most rotor')
+        if not len(rotor_types):
+            raise ValueError('Must have at least one rotor other than a '
+                             'Greek rotor')
+        thin = isinstance(reflector_mapping, str) and \
+            reflector_mapping.upper() in (reflector.upper() for reflector
+                                          in THIN_REFLECTORS)
+        if thin != (self.greek_rotor is not None):
+            raise ValueError('A Greek rotor must be used with a thin '
+                             'reflector, and a thin reflector with a Greek '
+                             'rotor')
         self.rotors = []
         for i in range(len(rotor_types)):
             self.rotors.append(EnigmaMachine.Rotor(
                 rotor_type=rotor_types[i],
                 position=rotor_positions[i],
                 ring_setting=ring_settings[i]))
+        # Rotors tell the machine when they move, see _stack_reflection.
+        for i, rotor in enumerate(self.rotors):
+            rotor._machine = self
+            rotor._index = i
         # Provides the option of having no plugboard.
         if not steckered_pairing:
             steckered_pairing = ''
         self.plugboard = EnigmaMachine.Plugboard(steckered_pairing)
-        self.reflector = EnigmaMachine.Reflector(reflector_mapping)
+        self.reflector = EnigmaMachine.Reflector(reflector_mapping,
+                                                 self.greek_rotor)
+        # Composed reflections of the rotor stack and the index of the
+        # left-most rotor moved since they were composed, see
+        # _stack_reflection.
+        self._reflection_cache = []
+        self._dirty = 0
 
     def __repr__(self):
         """
@@ -82,8 +130,9 @@ class EnigmaMachine:
             pb_str = 'no plugboard'
         else:
             pb_str = 'a plugboard'
-        return (f'Enigma Machine with {len(self.rotors)} rotors, a reflector'
-                f' and {pb_str}.')
+        greek_str = '' if self.greek_rotor is None else ' a Greek rotor,'
+        return (f'Enigma Machine with {len(self.rotors)} rotors,{greek_str} '
+                f'a reflector and {pb_str}.')
 
     @staticmethod
     def letter_to_number(letter):
@@ -183,6 +232,38 @@ class EnigmaMachine:
         # Last rotor always turns.
         self.rotors[-1].turn_rotor()
 
+    @staticmethod
+    def step_positions(positions, notches):
+        """
+        The numeric equivalent of turn_rotor_assembly. Turns a rotor assembly
+        given as rotor position numbers, without needing Rotor objects.
+
+        Example: step_positions([0, 4, 10], [16, 4, 21]) = [1, 5, 11]
+                 (the middle rotor is at its notch so it turns along with the
+                 rotor to its left).
+
+        Arguments:
+            positions (lst): Position numbers (0 - 25) of the rotors, left-most
+                             first. Updated in place.
+            notches (lst): Notch position numbers of the rotors. A notch of
+                           None never turns the rotor to its left.
+
+        Returns:
+            positions (lst): The updated positions list.
+        """
+        last = len(positions) - 1
+        # Checking rotors left to right means a rotor is always checked
+        # before it can have been turned by this key press, as in
+        # turn_rotor_assembly.
+        for i in range(1, last + 1):
+            if positions[i] == notches[i]:
+                positions[i - 1] = (positions[i - 1] + 1) % 26
+                if i < last:
+                    positions[i] = (positions[i] + 1) % 26
+        positions[last] = (positions[last] + 1) % 26
+
+        return positions
+
     def press_key(self, letter):
         """
         Emulates the pressing of a key on the Enigma keyboard. Every time a
@@ -210,26 +291,61 @@ class EnigmaMachine:
 
         # The first stage is the current goes through the plugboard.
         encrypted_letter = self.plugboard.map_letter(letter)
-
-        encrypted_letter = encrypted_letter
-        # The current flows through the rotors in reverse order to begin with
-        # (so right-most rotor first moving leftwards).
-        for rotor in reversed(self.rotors):
-            encrypted_letter = rotor.map_letter(encrypted_letter)
-
-        # Current now passes through the reflector.
-        encrypted_letter = self.reflector.map_letter(encrypted_letter)
-        # Current now passes back through the rotors, but starting from the
-        # left this time (so rotor 1 -> rotor 2 -> rotor 3...).
-        for rotor in self.rotors:
-            encrypted_letter = rotor.map_letter(encrypted_letter,
-                                                reverse=True)
+        number = EnigmaMachine.letter_to_number(encrypted_letter)
+
+        # The current flows through the right-most rotor, then leftwards
+        # through the rest of the rotors, the reflector, and back through the
+        # rotors to the right-most one again. Everything left of the
+        # right-most rotor is seen by the current as a single "reflection",
+        # which only changes when one of those rotors turns.
+        right_rotor = self.rotors[-1]
+        forward, reverse = right_rotor.wiring()
+        offset = EnigmaMachine.letter_to_number(right_rotor.position)
+        number = (forward[(number + offset) % 26] - offset) % 26
+        number = self._stack_reflection()[number]
+        number = (reverse[(number + offset) % 26] - offset) % 26
+        encrypted_letter = EnigmaMachine.number_to_letter(number)
 
         # Current finally flows back through the plugboard and lights up a
         # character to show you the encrypted letter. Exciting!
         encrypted_letter = self.plugboard.map_letter(encrypted_letter)
         return encrypted_letter
 
+    def _stack_reflection(self):
+        """
+        Finds the reflection seen by the current as it leaves the right-most
+        rotor, i.e. the reflector composed with every other rotor at its
+        current position.
+
+        The composition is built up rotor by rotor from the reflector
+        outwards and each partial composition is cached. Rotors record the
+        left-most one of them to move, whether turned by
+        turn_rotor_assembly or by hand, and only the compositions from that
+        rotor outwards are redone. On most key presses only the right-most
+        rotor turns and the cached reflection is used as it is.
+
+        Returns:
+            reflection (tuple): Tuple of 26 integers mapping each letter
+                                number to the letter number it is reflected
+                                to.
+        """
+        cache = self._reflection_cache
+        last = len(self.rotors) - 1
+        if self._dirty >= last and len(cache) == last + 1 and \
+           cache[0] is self.reflector.wiring():
+            return cache[-1]
+
+        reflection = self.reflector.wiring()
+        if not cache or cache[0] is not reflection:
+            cache[:] = [reflection]
+        # Compositions through rotors left of the dirty one are still valid.
+        del cache[min(self._dirty, len(cache) - 1) + 1:]
+        for rotor in self.rotors[len(cache) - 1:last]:
+            cache.append(rotor.compose_reflection(cache[-1]))
+        self._dirty = last
+
+        return cache[-1]
+
     def encrypt_message(self, message):
         """
         Encrypts a message using the EnigmaMachine by consecutively pressing
@@ -278,7 +394,8 @@ class EnigmaMachine:
 
         Attributes:
             rotor_type: (str)
-                A Roman Numeral expressing the rotor type (I-V).
+                A Roman Numeral expressing the rotor type (I-V), or one of
+                the Greek rotors (Beta or Gamma).
             position: (str)
                 A letter of the alphabet denoting the position of the rotor.
             ring_setting: (str)
@@ -286,8 +403,13 @@ class EnigmaMachine:
                 rotor.
             notch: (str)
                 A letter of the alphabet denoting the position of the notch
-                of the rotor.
+                of the rotor. None for a Greek rotor, which has no notch.
         """
+        # The machine the rotor is in and its index there, told when the
+        # rotor moves or its wiring changes.
+        _machine = None
+        _index = 0
+
         def __init__(self, rotor_type='I', position='A', ring_setting='A'):
             """
             Initialises a Rotor from an EnigmaMachine. Also updates the mapping
@@ -324,10 +446,18 @@ class EnigmaMachine:
             elif rotor_type == 'V':
                 self.mapping = 'VZBRGITYUPSDNHLXAWMJQOFECK'
                 self.notch = 'Z'
+            elif rotor_type == 'Beta':
+                self.mapping = 'LEYJVCNIXWPBQMDRTAKZGFUHOS'
+                self.notch = None
+            elif rotor_type == 'Gamma':
+                self.mapping = 'FSOKANUERHMBTIYCWLQPZXVGJD'
+                self.notch = None
             else:
-                raise ValueError('Must choose a rotor type I - V')
+                raise ValueError('Must choose a rotor type I - V, Beta or '
+                                 'Gamma')
             self.position = position
             self.ring_setting = ring_setting
+            self._wiring = (None, None)
             for rotor_item in [position, ring_setting]:
                 if type(rotor_item) != str:
                     raise ValueError('Attribute must be a string')
@@ -338,6 +468,33 @@ class EnigmaMachine:
             # Apply the ring setting to the rotor which changes its mapping.
             self.apply_ring_setting(ring_setting)
 
+        @property
+        def position(self):
+            return self._position
+
+        @position.setter
+        def position(self, position):
+            self._position = position
+            self._moved()
+
+        @property
+        def mapping(self):
+            return self._mapping
+
+        @mapping.setter
+        def mapping(self, mapping):
+            self._mapping = mapping
+            self._moved()
+
+        def _moved(self):
+            """
+            Tells the machine the rotor is in which compositions of the rotor
+            stack are stale, see EnigmaMachine._stack_reflection.
+            """
+            machine = self._machine
+            if machine is not None and self._index < machine._dirty:
+                machine._dirty = self._index
+
         def __str__(self):
             """
             String representation of a Rotor used for printing to console.
@@ -384,6 +541,54 @@ class EnigmaMachine:
 
             self.mapping = "".join(shifted_mapping)
 
+        def wiring(self):
+            """
+            The rotor wiring (including the ring setting) as numbers, for when
+            the rotor is in position "A".
+
+            Returns:
+                forward (tuple): Tuple of 26 integers, the letter number each
+                                 letter number is mapped to.
+                reverse (tuple): The inverse of forward, for when the current
+                                 passes back through the rotor.
+            """
+            # Cached against the mapping as apply_ring_setting can change it.
+            if self._wiring[0] != self.mapping:
+                forward = tuple(EnigmaMachine.letter_to_number(letter)
+                                for letter in self.mapping)
+                reverse = [0] * 26
+                for i, number in enumerate(forward):
+                    reverse[number] = i
+                self._wiring = (self.mapping, (forward, tuple(reverse)))
+
+            return self._wiring[1]
+
+        def compose_reflection(self, reflection):
+            """
+            Passes a reflection through the rotor at its current position.
+            If current leaving the rotor to the left is reflected according
+            to "reflection", this gives how current entering the rotor from
+            the right is reflected back out of it.
+
+            Arguments:
+                reflection (tuple): Tuple of 26 integers mapping each letter
+                                    number to the one it is reflected to.
+
+            Returns:
+                composed (tuple): The reflection seen from the right-hand side
+                                  of the rotor.
+            """
+            forward, reverse = self.wiring()
+            offset = EnigmaMachine.letter_to_number(self.position)
+            composed = []
+            for number in range(26):
+                number = (forward[(number + offset) % 26] - offset) % 26
+                number = reflection[number]
+                composed.append((reverse[(number + offset) % 26] - offset)
+                                % 26)
+
+            return tuple(composed)
+
         def map_letter(self, letter, reverse=False):
             """
             Given a letter input, finds the letter it would be mapped to
@@ -435,13 +640,24 @@ class EnigmaMachine:
         raises a key cryptographic weakness that the cryptoanalysts at
         Bletchley Park were able to exploit.
 
+        The thin reflectors of the four rotor naval machine were used with a
+        Greek rotor next to them. As that rotor never turns, the two together
+        act as a single reflector for a given Greek rotor setting, so the
+        Greek rotor is folded in once here and costs nothing per letter.
+
         Attributes:
             reflector_mapping: (str)
                 A string of length 26 that says what each letter is mapped to.
                 A mapping must pair up letters (so if A -> Y, then Y-> A).
-                Can also be one of three standard reflectors (A, B or C).
+                Can also be one of three standard reflectors (A, B or C) or
+                two thin reflectors (B-thin or C-thin). With a Greek rotor,
+                this is the mapping of the two folded together.
+            greek_rotor: (EnigmaMachine.Rotor)
+                The Greek rotor folded into the reflector, or None. Only
+                its position and ring setting when the reflector was made
+                count; later changes to it are ignored.
         """
-        def __init__(self, reflector_mapping='A'):
+        def __init__(self, reflector_mapping='A', greek_rotor=None):
             """
             Initialises a Reflector from an EnigmaMachine.
             Args:
@@ -451,7 +667,11 @@ class EnigmaMachine:
                     Can alternativelybe a string of length 26 that says which
                     each letter is mapped to.
                     A mapping must pair up letters (so if A -> Y, then
-                    Y-> A).
+                    Y-> A). 'B-thin' and 'C-thin' are the thin reflectors
+                    of the four rotor naval machine.
+                greek_rotor (EnigmaMachine.Rotor):
+                    A Greek rotor to fold into the reflector at its current
+                    position and ring setting, or None.
 
             Raises:
                 ValueError if mapping does not map letter pairs.
@@ -462,6 +682,10 @@ class EnigmaMachine:
                 self.reflector_mapping = 'YRUHQSLDPXNGOKMIEBFZCWVJAT'
             elif reflector_mapping.upper() == 'C':
                 self.reflector_mapping = 'FVPJIAOYEDRZXWGCTKUQSBNMHL'
+            elif reflector_mapping.upper() == 'B-THIN':
+                self.reflector_mapping = 'ENKQAUYWJICOPBLMDXZVFTHRGS'
+            elif reflector_mapping.upper() == 'C-THIN':
+                self.reflector_mapping = 'RDOBJNTKVEHMLFCWZAXGYIPSUQ'
             else:
                 self.reflector_mapping = reflector_mapping
             if type(self.reflector_mapping) != str or \
@@ -475,6 +699,12 @@ class EnigmaMachine:
                     raise ValueError('Reflector must have matching pairs, '
                                      f'check letter '
                                      f'"{self.reflector_mapping[i]}"')
+            self._wiring = (None, None)
+            self.greek_rotor = greek_rotor
+            if greek_rotor is not None:
+                self.reflector_mapping = ''.join(
+                    EnigmaMachine.number_to_letter(number) for number
+                    in greek_rotor.compose_reflection(self.wiring()))
 
         def __str__(self):
             """
@@ -483,6 +713,21 @@ class EnigmaMachine:
             return (f'A reflector for an Enigma Machine with mapping'
                     f' "{self.reflector_mapping}".')
 
+        def wiring(self):
+            """
+            The reflector mapping as numbers.
+
+            Returns:
+                wiring (tuple): Tuple of 26 integers, the letter number each
+                                letter number is paired with.
+            """
+            if self._wiring[0] != self.reflector_mapping:
+                wiring = tuple(EnigmaMachine.letter_to_number(letter)
+                               for letter in self.reflector_mapping)
+                self._wiring = (self.reflector_mapping, wiring)
+
+            return self._wiring[1]
+
         def map_letter(self, letter):
             """
             Gives the corresponding letter pair of a reflector.
@@ -554,11 +799,29 @@ class EnigmaMachine:
                         raise ValueError(error)
                     elif i % 3 != 2 and not steckered_pairing[i].isalpha():
                         raise ValueError(error)
+            self._wiring = (None, None)
 
         def __str__(self):
             return (f'A plugboard for an Enigma Machine with steckered '
                     f'pairing "{self.steckered_pairing}".')
 
+        def wiring(self):
+            """
+            The plugboard pairing as numbers.
+
+            Returns:
+                wiring (tuple): Tuple of 26 integers, the letter number each
+                                letter number is paired with (or itself if it
+                                is not steckered).
+            """
+            if self._wiring[0] != self.steckered_pairing:
+                wiring = tuple(EnigmaMachine.letter_to_number(self.map_letter(
+                    EnigmaMachine.number_to_letter(number)))
+                    for number in range(26))
+                self._wiring = (self.steckered_pairing, wiring)
+
+            return self._wiring[1]
+
         def map_letter(self, letter):
             """
             Gives the corresponding letter pair of a plugboard.
@@ -0,0 +1,900 @@
+# -*- coding: utf-8 -*-
+"""Enigma key search.
+
+Tools for recovering the settings of an EnigmaMachine from ciphertext alone:
+a fast integer-only trial decryptor, a scoring function for trial
+decryptions, an enumerator of the key space that skips configurations which
+are equivalent for a given message length, a ring setting recovery stage,
+and a checkpointed search over rotor orders and positions that can be
+resumed after being interrupted.
+
+The key space is shrunk using two properties of the machine. Firstly, the
+wiring a rotor presents to the current only depends on the difference
+between its position and its ring setting (its "offset"); the position on its
+own only matters for deciding when rotors turn. Secondly, the notch of the
+left-most rotor never turns anything, so its ring setting has no effect at
+all. For a message of a given length two configurations with the same
+offsets and the same pattern of turnovers give identical decrypts, so only
+one of them needs to be tried.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import string
+from collections import namedtuple
+from itertools import permutations, product
+
+from enigma_machine import GREEK_ROTOR_TYPES, EnigmaMachine
+
+
+def text_to_numbers(text):
+    """
+    Converts the letters of a text to numbers from 0 to 25, dropping every
+    other character.
+    """
+    return [ord(letter) - 65 for letter in text.upper()
+            if letter in string.ascii_uppercase]
+
+
+def numbers_to_text(numbers):
+    """
+    Converts numbers from 0 to 25 to a string of upper case letters.
+    """
+    return ''.join(chr(number + 65) for number in numbers)
+
+
+def message_numbers(message):
+    """
+    Converts the letters of a message to numbers from 0 to 25, as
+    text_to_numbers does, checking that every letter is from A to Z.
+
+    Raises:
+        ValueError if the message contains any other letters.
+    """
+    numbers = text_to_numbers(message)
+    if len(numbers) != sum(letter.isalpha() for letter in message):
+        raise ValueError('Message letters must be from A to Z')
+
+    return numbers
+
+
+def fill_letters(message, numbers):
+    """
+    A message with its letters replaced in turn by the letters of a list of
+    letter numbers and every other character left in place, as
+    EnigmaMachine.encrypt_message outputs it.
+    """
+    if len(numbers) == len(message):
+        return numbers_to_text(numbers)
+    letters = iter(numbers_to_text(numbers))
+
+    return ''.join(next(letters) if letter.isalpha() else letter
+                   for letter in message)
+
+
+def encrypt_numbers(numbers, positions, notches, right_forward,
+                    right_reverse, right_ring, plugboard, reflection):
+    """
+    Encrypts (or equally decrypts) a list of letter numbers from tables.
+    Each letter turns the rotors and then passes through the plugboard, the
+    right-most rotor and the reflection through every other rotor. This is
+    the inner loop of every table based engine.
+
+    Arguments:
+        numbers (lst): Letter numbers to encrypt.
+        positions (lst): Rotor position numbers. Updated in place to the
+                         final rotor positions.
+        notches (lst): Notch position numbers of the rotors.
+        right_forward (lst): Forward wiring of the right-most rotor at each
+                             offset.
+        right_reverse (lst): Reverse wiring of the right-most rotor at each
+                             offset.
+        right_ring (int): Ring setting number of the right-most rotor.
+        plugboard (lst): Plugboard wiring.
+        reflection (callable): Takes rotor position numbers and gives the
+                               reflection through the reflector and every
+                               rotor but the right-most one.
+
+    Returns:
+        encrypted (lst): The encrypted letter numbers.
+    """
+    last = len(positions) - 1
+    current = reflection(positions)
+    encrypted = []
+    for number in numbers:
+        # Turn the rotors, as in EnigmaMachine.step_positions.
+        moved = False
+        for i in range(1, last + 1):
+            if positions[i] == notches[i]:
+                positions[i - 1] = (positions[i - 1] + 1) % 26
+                if i < last:
+                    positions[i] = (positions[i] + 1) % 26
+                moved = True
+        positions[last] = (positions[last] + 1) % 26
+        if moved:
+            current = reflection(positions)
+
+        offset = (positions[last] - right_ring) % 26
+        number = right_forward[offset][plugboard[number]]
+        encrypted.append(plugboard[right_reverse[offset][current[number]]])
+
+    return encrypted
+
+
+def index_of_coincidence(text):
+    """
+    The index of coincidence of the letters of a text: the chance that two
+    letters picked at random from it are the same. English or German
+    plaintext scores around 0.066-0.076, while Enigma ciphertext or a wrong
+    trial decryption scores close to 1 / 26 = 0.038.
+
+    Arguments:
+        text (str or lst): Text, or list of letter numbers, to score.
+
+    Returns:
+        index (float): Index of coincidence between 0 and 1.
+    """
+    return _index_of_coincidence_of_counts(letter_counts(text))
+
+
+def _index_of_coincidence_of_counts(counts):
+    """
+    The index of coincidence of a text with the given letter counts.
+    """
+    length = sum(counts)
+    if length < 2:
+        return 0.0
+
+    return sum(count * (count - 1) for count in counts) / \
+        (length * (length - 1))
+
+
+# Relative frequencies (percent) of letters in English text.
+ENGLISH_FREQUENCIES = [8.2, 1.5, 2.8, 4.3, 12.7, 2.2, 2.0, 6.1, 7.0, 0.15,
+                       0.77, 4.0, 2.4, 6.7, 7.5, 1.9, 0.095, 6.0, 6.3, 9.1,
+                       2.8, 0.98, 2.4, 0.15, 2.0, 0.074]
+_LOG_FREQUENCIES = [math.log(frequency / 100)
+                    for frequency in ENGLISH_FREQUENCIES]
+
+
+def letter_frequency(text):
+    """
+    The mean log frequency of the letters of a text in English. Unlike the
+    index of coincidence it depends on the language, but it tells plaintext
+    apart from a wrong trial decryption after fewer letters.
+
+    Arguments:
+        text (str or lst): Text, or list of letter numbers, to score.
+
+    Returns:
+        score (float): Mean natural log of the letter frequencies, around
+                       -2.9 for English and -3.3 for random letters.
+    """
+    return _letter_frequency_of_counts(letter_counts(text))
+
+
+def _letter_frequency_of_counts(counts):
+    """
+    The letter_frequency of a text with the given letter counts.
+    """
+    length = sum(counts)
+    if length == 0:
+        return 0.0
+
+    return sum(count * weight for count, weight
+               in zip(counts, _LOG_FREQUENCIES)) / length
+
+
+def letter_counts(text):
+    """
+    The number of times each letter appears in a text.
+
+    Arguments:
+        text (str or lst): Text, or list of letter numbers.
+
+    Returns:
+        counts (lst): 26 counts, one per letter.
+    """
+    if isinstance(text, str):
+        text = text_to_numbers(text)
+    counts = [0] * 26
+    for number in text:
+        counts[number] += 1
+
+    return counts
+
+
+# Scoring functions a KeySearch can be configured with, by name.
+SCORES = {'index_of_coincidence': index_of_coincidence,
+          'letter_frequency': letter_frequency}
+
+# The same scores worked out from letter counts, so a trial decryption can be
+# scored as it goes.
+_COUNT_SCORES = {'index_of_coincidence': _index_of_coincidence_of_counts,
+                 'letter_frequency': _letter_frequency_of_counts}
+
+# How far each score of English plaintext strays from its usual value: over
+# n letters it is within spread / sqrt(n) about two times in three. These are
+# the standard deviations of one letter's contribution to each score, from
+# ENGLISH_FREQUENCIES. See KeySearch.run_unit.
+_PROBABILITIES = [frequency / sum(ENGLISH_FREQUENCIES)
+                  for frequency in ENGLISH_FREQUENCIES]
+SCORE_SPREADS = {
+    'index_of_coincidence': 2 * math.sqrt(
+        sum(p ** 3 for p in _PROBABILITIES)
+        - sum(p ** 2 for p in _PROBABILITIES) ** 2),
+    'letter_frequency': math.sqrt(
+        sum(p * weight ** 2 for p, weight
+            in zip(_PROBABILITIES, _LOG_FREQUENCIES))
+        - sum(p * weight for p, weight
+              in zip(_PROBABILITIES, _LOG_FREQUENCIES)) ** 2)}
+
+# Letters decrypted at a time when a trial may be dropped early.
+SEGMENT_LENGTH = 64
+
+# Rotor tables by rotor type, see rotor_tables.
+_ROTOR_TABLES = {}
+
+
+def rotor_tables(rotor_type):
+    """
+    Numeric wiring of a rotor type for every offset (position number minus
+    ring setting number), as seen by current entering the rotor.
+
+    Arguments:
+        rotor_type (str): Rotor type, as for EnigmaMachine.Rotor.
+
+    Returns:
+        forward (tuple): forward[offset][number] is the letter number that
+                         letter number is mapped to at that offset.
+        reverse (tuple): The inverse mappings of forward, for current
+                         passing back through the rotor.
+        notch (int): Number of the rotor's notch position, or None for a
+                     Greek rotor.
+    """
+    if rotor_type not in _ROTOR_TABLES:
+        rotor = EnigmaMachine.Rotor(rotor_type=rotor_type)
+        wiring_forward, wiring_reverse = rotor.wiring()
+        forward = []
+        reverse = []
+        for offset in range(26):
+            forward.append(tuple((wiring_forward[(number + offset) % 26]
+                                  - offset) % 26 for number in range(26)))
+            reverse.append(tuple((wiring_reverse[(number + offset) % 26]
+                                  - offset) % 26 for number in range(26)))
+        notch = None if rotor.notch is None else \
+            EnigmaMachine.letter_to_number(rotor.notch)
+        _ROTOR_TABLES[rotor_type] = (tuple(forward), tuple(reverse), notch)
+
+    return _ROTOR_TABLES[rotor_type]
+
+
+def folded_reflectors(greek_rotor_types=GREEK_ROTOR_TYPES,
+                      thin_reflectors=('B-thin', 'C-thin')):
+    """
+    The effective reflectors of a four rotor naval machine: each thin
+    reflector folded together with each Greek rotor at each offset. Passing
+    these as reflector mappings to TrialDecryptor or KeySearch searches four
+    rotor traffic at the cost of three rotor traffic.
+
+    Example:
+        reflectors = folded_reflectors()
+        search = KeySearch(ciphertext, reflectors=list(reflectors))
+        greek_rotor_type, greek_setting, thin_reflector = \
+            reflectors[search.run()[0].reflector_mapping]
+
+    Arguments:
+        greek_rotor_types (lst): Greek rotor types to fold in.
+        thin_reflectors (lst): Thin reflectors to fold them into.
+
+    Returns:
+        reflectors (dict): (greek_rotor_type, greek_setting, thin_reflector)
+                           by folded reflector mapping, where greek_setting
+                           is the Greek rotor's position with ring setting
+                           'A' (only their difference matters).
+    """
+    reflectors = {}
+    for thin_reflector in thin_reflectors:
+        for greek_rotor_type in greek_rotor_types:
+            for greek_setting in string.ascii_uppercase:
+                greek_rotor = EnigmaMachine.Rotor(greek_rotor_type,
+                                                  greek_setting)
+                mapping = EnigmaMachine.Reflector(
+                    thin_reflector, greek_rotor).reflector_mapping
+                reflectors[mapping] = (greek_rotor_type, greek_setting,
+                                       thin_reflector)
+
+    return reflectors
+
+
+class TrialDecryptor:
+    """
+    A class to perform many trial decryptions with the same rotor order,
+    reflector and plugboard but different rotor positions and ring settings.
+    It works only with letter numbers and precomputed tables, so is much
+    faster than building an EnigmaMachine for each trial.
+
+    Attributes:
+        rotor_types: (tuple)
+            Types of rotor in the machine, left-most first.
+        notches: (tuple)
+            Notch position numbers of the rotors.
+    """
+    def __init__(self, rotor_types, reflector_mapping='B',
+                 steckered_pairing=''):
+        """
+        Initialises a TrialDecryptor.
+        Args:
+            rotor_types (lst): List of types of rotor in the machine.
+            reflector_mapping (str): As for EnigmaMachine.
+            steckered_pairing (str): As for EnigmaMachine.
+
+        Raises:
+            ValueError if any of the settings are invalid. A Greek rotor has
+            to be folded into the reflector instead, see folded_reflectors.
+        """
+        if not rotor_types:
+            raise ValueError('Must have at least one rotor')
+        if any(rotor_type in GREEK_ROTOR_TYPES for rotor_type in rotor_types):
+            raise ValueError('Greek rotors must be folded into the reflector')
+        # Tuples throughout, so a decryptor is never written to once made.
+        self.rotor_types = tuple(rotor_types)
+        tables = [rotor_tables(rotor_type) for rotor_type in rotor_types]
+        self._forward = tuple(forward for forward, _, _ in tables)
+        self._reverse = tuple(reverse for _, reverse, _ in tables)
+        self.notches = tuple(notch for _, _, notch in tables)
+        self._reflector = EnigmaMachine.Reflector(reflector_mapping).wiring()
+        self._plugboard = EnigmaMachine.Plugboard(
+            steckered_pairing or '').wiring()
+
+    def stack_reflection(self, positions, rings):
+        """
+        The reflector composed with every rotor except the right-most one,
+        as in EnigmaMachine._stack_reflection.
+        """
+        reflection = self._reflector
+        for i in range(len(positions) - 1):
+            offset = (positions[i] - rings[i]) % 26
+            forward = self._forward[i][offset]
+            reverse = self._reverse[i][offset]
+            reflection = [reverse[reflection[forward[number]]]
+                          for number in range(26)]
+
+        return reflection
+
+    def decrypt(self, numbers, positions, rings, reflection=None):
+        """
+        Decrypts (or equally encrypts) a list of letter numbers.
+
+        Arguments:
+            numbers (lst): Letter numbers to decrypt.
+            positions (lst): Rotor position numbers. Updated in place to the
+                             final rotor positions.
+            rings (lst): Ring setting numbers.
+            reflection (callable): Takes rotor position numbers and gives
+                                   stack_reflection at those positions, for
+                                   callers with it precomputed.
+
+        Returns:
+            decrypted (lst): The decrypted letter numbers.
+        """
+        if reflection is None:
+            def reflection(positions):
+                return self.stack_reflection(positions, rings)
+
+        return encrypt_numbers(numbers, positions, self.notches,
+                               self._forward[-1], self._reverse[-1],
+                               rings[-1], self._plugboard, reflection)
+
+    def decrypt_message(self, message, rotor_positions, ring_settings):
+        """
+        Decrypts a message, passing through any characters that aren't
+        letters as EnigmaMachine.encrypt_message does.
+
+        Arguments:
+            message (str): Message to decrypt.
+            rotor_positions (str): Initial positions of the rotors.
+            ring_settings (str): Ring settings of the rotors.
+
+        Returns:
+            decrypted_message (str): The decrypted message.
+            rotor_positions (str): The final positions of the rotors.
+
+        Raises:
+            ValueError if the settings don't match the number of rotors or
+            the message contains letters other than A to Z.
+        """
+        positions = text_to_numbers(rotor_positions)
+        rings = text_to_numbers(ring_settings)
+        if len(positions) != len(self.notches) or \
+           len(rings) != len(self.notches):
+            raise ValueError('Number of rotor positions and ring settings '
+                             'must match with number of rotors')
+        decrypted = self.decrypt(message_numbers(message), positions, rings)
+
+        return fill_letters(message, decrypted), numbers_to_text(positions)
+
+
+def stepping_signature(notches, positions, length):
+    """
+    The pattern of rotor turnovers over a number of key presses: for each
+    key press, how far each rotor except the right-most one turns. The
+    right-most rotor always turns one place so is left out.
+
+    Arguments:
+        notches (lst): Notch position numbers of the rotors.
+        positions (lst): Initial rotor position numbers.
+        length (int): Number of key presses.
+
+    Returns:
+        signature (tuple): One tuple of turns per key press.
+    """
+    positions = list(positions)
+    signature = []
+    for _ in range(length):
+        previous = positions[:-1]
+        EnigmaMachine.step_positions(positions, notches)
+        signature.append(tuple((position - previous_position) % 26
+                               for position, previous_position
+                               in zip(positions, previous)))
+
+    return tuple(signature)
+
+
+def stepping_classes(rotor_types, length):
+    """
+    Groups the starting positions of a rotor order by their turnover pattern
+    for a message of the given length.
+
+    The left-most rotor's position never affects turnovers, so only the
+    positions of the other rotors are grouped. This enumerates every
+    combination of their positions, so grows by a factor of 26 for each
+    extra rotor.
+
+    Arguments:
+        rotor_types (lst): Types of rotor in the machine, left-most first.
+        length (int): Number of letters in the message.
+
+    Returns:
+        classes (lst): One tuple of position numbers (for all rotors but the
+                       left-most) per distinct turnover pattern, the
+                       smallest in each group.
+    """
+    notches = [rotor_tables(rotor_type)[2] for rotor_type in rotor_types]
+    classes = {}
+    for stepping_positions in product(range(26),
+                                      repeat=len(rotor_types) - 1):
+        signature = stepping_signature(notches, (0,) + stepping_positions,
+                                       length)
+        classes.setdefault(signature, stepping_positions)
+
+    return list(classes.values())
+
+
+def canonical_configurations(rotor_types, length):
+    """
+    Enumerates rotor positions and ring settings of a rotor order, giving
+    exactly one configuration for each distinct way a message of the given
+    length can be decrypted.
+
+    Each configuration is a choice of rotor offsets combined with a choice
+    of turnover pattern. The left-most ring setting is always 'A'.
+
+    Example: For rotors I, II and III and a 60 letter message there are
+             111 turnover patterns, giving 1,950,936 configurations instead
+             of 26 ** 6 = 308,915,776.
+
+    Arguments:
+        rotor_types (lst): Types of rotor in the machine, left-most first.
+        length (int): Number of letters in the message.
+
+    Yields:
+        rotor_positions (str): Initial positions of the rotors.
+        ring_settings (str): Ring settings of the rotors.
+    """
+    classes = stepping_classes(rotor_types, length)
+    for offsets in product(range(26), repeat=len(rotor_types)):
+        for stepping_positions in classes:
+            positions = (offsets[0],) + stepping_positions
+            rings = (0,) + tuple((position - offset) % 26 for position, offset
+                                 in zip(stepping_positions, offsets[1:]))
+            yield numbers_to_text(positions), numbers_to_text(rings)
+
+
+def recover_ring_settings(ciphertext, rotor_types, rotor_positions,
+                          ring_settings, reflector_mapping='B',
+                          steckered_pairing='', score=index_of_coincidence):
+    """
+    Resolves the ring settings of a machine whose rotor offsets are already
+    known, typically from a search with ring settings fixed at 'A', which
+    decrypts well apart from where rotors turn over at the wrong time.
+
+    Turning a rotor's ring and position by the same amount keeps its offset
+    but moves its turnover. Every distinct turnover pattern of the rotors
+    right of the left-most one is tried with the offsets kept, and the best
+    scoring kept. The left-most rotor's turnovers never matter so its
+    settings are left as they are.
+
+    Arguments:
+        ciphertext (str): The message to decrypt.
+        rotor_types (lst): Types of rotor in the machine, left-most first.
+        rotor_positions (str): Rotor positions found by the search.
+        ring_settings (str): Ring settings used in the search.
+        reflector_mapping (str): As for EnigmaMachine.
+        steckered_pairing (str): As for EnigmaMachine.
+        score (callable): Scores a list of decrypted letter numbers, higher
+                          scores being better.
+
+    Returns:
+        rotor_positions (str): Recovered rotor positions.
+        ring_settings (str): Recovered ring settings.
+        score (float): Score of the decrypt with the recovered settings.
+    """
+    decryptor = TrialDecryptor(rotor_types, reflector_mapping,
+                               steckered_pairing)
+    numbers = text_to_numbers(ciphertext)
+    positions = text_to_numbers(rotor_positions)
+    rings = text_to_numbers(ring_settings)
+    offsets = [(position - ring) % 26 for position, ring
+               in zip(positions, rings)]
+    best = (None, positions, rings)
+    for stepping_positions in stepping_classes(rotor_types, len(numbers)):
+        trial_positions = positions[:1] + list(stepping_positions)
+        trial_rings = rings[:1] + [(position - offset) % 26
+                                   for position, offset
+                                   in zip(stepping_positions, offsets[1:])]
+        trial_score = score(decryptor.decrypt(numbers, list(trial_positions),
+                                              trial_rings))
+        if best[0] is None or trial_score > best[0]:
+            best = (trial_score, trial_positions, trial_rings)
+
+    best_score, positions, rings = best
+    return numbers_to_text(positions), numbers_to_text(rings), best_score
+
+
+Candidate = namedtuple('Candidate', ['score', 'rotor_types',
+                                     'reflector_mapping', 'rotor_positions',
+                                     'ring_settings'])
+
+
+def merge_candidates(candidates, top):
+    """
+    Merges lists of candidates, keeping the best scoring.
+
+    Arguments:
+        candidates (iterable): Candidates to merge.
+        top (int): Number of candidates to keep.
+
+    Returns:
+        best (lst): The top candidates, best first. Ties are broken by the
+                    settings so the result doesn't depend on the order the
+                    candidates were found in.
+    """
+    unique = set(Candidate(candidate[0], tuple(candidate[1]), *candidate[2:])
+                 for candidate in candidates)
+    return sorted(unique, key=lambda candidate: (-candidate.score,
+                                                 candidate[1:]))[:top]
+
+
+class KeySearch:
+    """
+    A class to represent a ciphertext-only search over rotor orders, rotor
+    positions and reflectors, with fixed ring settings and plugboard.
+
+    The search is split into deterministic work units, one per rotor order,
+    reflector and left-most rotor position. Units can be run in any order
+    and by different processes; run() records completed units and the best
+    candidates found so far in a checkpoint file so that an interrupted
+    search resumes where it left off.
+
+    Attributes:
+        ciphertext: (str)
+            The message to decrypt.
+        rotor_orders: (lst)
+            Rotor orders to try, each a tuple of rotor types.
+        reflectors: (lst)
+            Reflector mappings to try.
+        ring_settings: (str)
+            Ring settings used for every trial.
+        steckered_pairing: (str)
+            Plugboard used for every trial.
+        top: (int)
+            Number of best candidates to keep.
+        score: (str)
+            Name of the scoring function in SCORES.
+        tolerance: (float)
+            How many spreads below the bar a trial's score so far must be
+            for it to be dropped early, or None to score every trial in
+            full. See run_unit.
+    """
+    def __init__(self, ciphertext, rotor_orders=None, reflectors=('B',),
+                 ring_settings=None, steckered_pairing='', top=10,
+                 score='index_of_coincidence', tolerance=None):
+        """
+        Initialises a KeySearch.
+        Args:
+            ciphertext (str): The message to decrypt.
+            rotor_orders (lst): Rotor orders to try. Defaults to all 60
+                                orders of three of the rotors I - V.
+            reflectors (lst): Reflector mappings to try.
+            ring_settings (str): Ring settings for every trial. Defaults to
+                                 'A' for every rotor.
+            steckered_pairing (str): Plugboard for every trial.
+            top (int): Number of best candidates to keep.
+            score (str): Name of the scoring function in SCORES.
+            tolerance (float): Drop trials early whose score so far is this
+                               many spreads below the bar, see run_unit.
+                               None (the default) to score every trial in
+                               full.
+
+        Raises:
+            ValueError if there are no rotor orders, rotor orders have
+            different numbers of rotors, or the ring settings or score are
+            invalid.
+        """
+        if rotor_orders is None:
+            rotor_orders = permutations(['I', 'II', 'III', 'IV', 'V'], 3)
+        self.ciphertext = ciphertext
+        self.rotor_orders = [tuple(order) for order in rotor_orders]
+        self.reflectors = list(reflectors)
+        if not self.rotor_orders:
+            raise ValueError('Must have at least one rotor order')
+        if len(set(len(order) for order in self.rotor_orders)) != 1:
+            raise ValueError('Rotor orders must all have the same number of '
+                             'rotors')
+        num_rotors = len(self.rotor_orders[0])
+        self.ring_settings = ring_settings or 'A' * num_rotors
+        if len(text_to_numbers(self.ring_settings)) != num_rotors:
+            raise ValueError('Number of ring settings must match with number '
+                             'of rotors')
+        self.steckered_pairing = steckered_pairing or ''
+        self.top = top
+        if score not in SCORES:
+            raise ValueError(f'Unknown score "{score}"')
+        self.score = score
+        if tolerance is not None and tolerance < 0:
+            raise ValueError('Tolerance must not be negative')
+        self.tolerance = tolerance
+        self._numbers = text_to_numbers(ciphertext)
+        # Letters decrypted by run_unit, to measure how many trials are
+        # dropped early.
+        self.letters_decrypted = 0
+
+    def parameters(self):
+        """
+        The parameters the search was initialised with, as a dictionary that
+        can be serialised to JSON and passed back to the initialiser.
+        """
+        parameters = {'ciphertext': self.ciphertext,
+                      'rotor_orders': [list(order)
+                                       for order in self.rotor_orders],
+                      'reflectors': self.reflectors,
+                      'ring_settings': self.ring_settings,
+                      'steckered_pairing': self.steckered_pairing,
+                      'top': self.top,
+                      'score': self.score}
+        # Left out when not set, so checkpoints of searches without it
+        # still match.
+        if self.tolerance is not None:
+            parameters['tolerance'] = self.tolerance
+
+        return parameters
+
+    def fingerprint(self):
+        """
+        A hash of the search parameters, used to check a checkpoint belongs
+        to this search.
+        """
+        encoded = json.dumps(self.parameters(), sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def work_units(self):
+        """
+        The work units making up the search.
+
+        Returns:
+            units (lst): List of (rotor_order, reflector_mapping,
+                         left_position) tuples. A unit's index in this list
+                         is its id.
+        """
+        return [(order, reflector, position)
+                for order in self.rotor_orders
+                for reflector in self.reflectors
+                for position in range(26)]
+
+    def run_unit(self, unit, threshold=None):
+        """
+        Tries every position of the rotors right of the left-most one for a
+        work unit.
+
+        With a tolerance, every trial's first segment is decrypted first and
+        the rest are tried best first, a segment at a time. A trial is
+        dropped once its score so far is more than tolerance spreads (see
+        SCORE_SPREADS) below the bar: the worst of the unit's top candidates
+        so far, or threshold if that is higher. As the allowance shrinks
+        with the square root of the letters decrypted, wrong trials are
+        usually dropped after a small part of a long message once a strong
+        bar is known. Plaintext is only dropped by chance, which for a
+        tolerance of 3 or more is rare, so the best candidates are almost
+        always the same as without one. Every score kept is exact.
+
+        Arguments:
+            unit (tuple): A work unit from work_units.
+            threshold (float): Score a trial must reach to be worth
+                               keeping, for example the worst of the best
+                               candidates of other units. None for no
+                               threshold.
+
+        Returns:
+            candidates (lst): The unit's top candidates, best first. Trials
+                              scoring below threshold may be left out.
+        """
+        order, reflector, left_position = unit
+        decryptor = TrialDecryptor(order, reflector, self.steckered_pairing)
+        rings = text_to_numbers(self.ring_settings)
+        numbers = self._numbers
+        # The left-most rotors move together through few positions in a
+        # unit, so their reflections are worked out once each.
+        reflections = {}
+
+        def reflection(positions):
+            key = tuple(positions[:-1])
+            if key not in reflections:
+                reflections[key] = decryptor.stack_reflection(positions,
+                                                              rings)
+            return reflections[key]
+
+        if self.tolerance is None:
+            score = SCORES[self.score]
+            candidates = []
+            for positions in product(range(26), repeat=len(order) - 1):
+                positions = [left_position] + list(positions)
+                rotor_positions = numbers_to_text(positions)
+                candidates.append(Candidate(
+                    score(decryptor.decrypt(numbers, positions, rings,
+                                            reflection)),
+                    order, reflector, rotor_positions, self.ring_settings))
+                if len(candidates) >= 4 * self.top:
+                    candidates = merge_candidates(candidates, self.top)
+            self.letters_decrypted += len(numbers) * 26 ** (len(order) - 1)
+
+            return merge_candidates(candidates, self.top)
+
+        score = _COUNT_SCORES[self.score]
+        allowance = self.tolerance * SCORE_SPREADS[self.score]
+        trials = []
+        for positions in product(range(26), repeat=len(order) - 1):
+            positions = [left_position] + list(positions)
+            rotor_positions = numbers_to_text(positions)
+            counts = letter_counts(decryptor.decrypt(
+                numbers[:SEGMENT_LENGTH], positions, rings, reflection))
+            trials.append((score(counts), rotor_positions, positions, counts))
+        self.letters_decrypted += len(trials) * min(SEGMENT_LENGTH,
+                                                    len(numbers))
+        trials.sort(key=lambda trial: -trial[0])
+
+        # Scores of the best trials so far, worst first.
+        best = []
+        candidates = []
+        for trial_score, rotor_positions, positions, counts in trials:
+            bar = threshold
+            if len(best) == self.top and (bar is None or best[0] > bar):
+                bar = best[0]
+            done = sum(counts)
+            dropped = False
+            while done < len(numbers):
+                if bar is not None and \
+                   trial_score < bar - allowance / math.sqrt(done):
+                    dropped = True
+                    break
+                segment = decryptor.decrypt(
+                    numbers[done:done + SEGMENT_LENGTH], positions, rings,
+                    reflection)
+                for number in segment:
+                    counts[number] += 1
+                done += len(segment)
+                self.letters_decrypted += len(segment)
+                trial_score = score(counts)
+            if dropped:
+                continue
+            candidates.append(Candidate(trial_score, order, reflector,
+                                        rotor_positions, self.ring_settings))
+            if len(best) < self.top:
+                heapq.heappush(best, trial_score)
+            else:
+                heapq.heappushpop(best, trial_score)
+            if len(candidates) >= 4 * self.top:
+                candidates = merge_candidates(candidates, self.top)
+
+        return merge_candidates(candidates, self.top)
+
+    def load_checkpoint(self, path):
+        """
+        Reads a checkpoint file written by save_checkpoint.
+
+        Arguments:
+            path (str): Path to the checkpoint file.
+
+        Returns:
+            completed (set): Ids of the completed work units.
+            candidates (lst): The best candidates found so far.
+
+        Raises:
+            ValueError if the checkpoint is for a different search.
+        """
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['fingerprint'] != self.fingerprint():
+            raise ValueError(f'Checkpoint "{path}" is for a different search')
+        candidates = [Candidate(candidate[0], tuple(candidate[1]),
+                                *candidate[2:])
+                      for candidate in checkpoint['candidates']]
+
+        return set(checkpoint['completed']), candidates
+
+    def save_checkpoint(self, path, completed, candidates):
+        """
+        Writes the search progress to a checkpoint file. The file is
+        written to a temporary file first and then moved into place, so a
+        crash part way through writing never leaves a corrupt checkpoint.
+
+        Arguments:
+            path (str): Path to the checkpoint file.
+            completed (set): Ids of the completed work units.
+            candidates (lst): The best candidates found so far.
+        """
+        checkpoint = {'fingerprint': self.fingerprint(),
+                      'parameters': self.parameters(),
+                      'completed': sorted(completed),
+                      'candidates': [list(candidate)
+                                     for candidate in candidates]}
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, path)
+
+    def run(self, checkpoint_path=None, max_units=None, progress=None):
+        """
+        Runs the search, resuming from the checkpoint file if it exists.
+
+        Arguments:
+            checkpoint_path (str): Path to the checkpoint file, updated after
+                                   each work unit. If None, nothing is saved.
+            max_units (int): Stop after running this many work units, for
+                             splitting a search into time-limited runs.
+            progress (callable): Called with the number of completed and
+                                 total work units after each work unit.
+
+        Returns:
+            candidates (lst): The best candidates found, best first.
+        """
+        completed = set()
+        candidates = []
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            completed, candidates = self.load_checkpoint(checkpoint_path)
+
+        units = self.work_units()
+        units_run = 0
+        for unit_id, unit in enumerate(units):
+            if unit_id in completed:
+                continue
+            if max_units is not None and units_run >= max_units:
+                break
+            threshold = None
+            if len(candidates) >= self.top:
+                threshold = candidates[self.top - 1].score
+            candidates = merge_candidates(
+                candidates + self.run_unit(unit, threshold), self.top)
+            completed.add(unit_id)
+            units_run += 1
+            if checkpoint_path is not None:
+                self.save_checkpoint(checkpoint_path, completed, candidates)
+            if progress is not None:
+                progress(len(completed), len(units))
+
+        return candidates
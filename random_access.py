@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Random access decryption of large ciphertext files.
+
+Only letters turn the rotors, so the rotor positions at a given byte of a
+file depend on how many letters come before it. Decrypting from the middle
+of a file would normally mean replaying it from the start. Instead:
+
+    * build_index makes a sidecar index in one streaming pass, holding the
+      number of letters before the start of each fixed size block, and
+    * RandomAccessReader memory maps the file, counts the letters from the
+      start of the block to the requested byte, works out the rotor
+      positions straight from the stepping schedule and decrypts only the
+      requested range.
+
+So paging through a file takes time proportional to the size of each page,
+however far into the file it is.
+
+Files are read as bytes. As with EnigmaMachine.encrypt_message, the letters
+A to Z (either case) are decrypted, to upper case, and every other byte is
+passed through unchanged.
+
+Ran as a script it indexes a file, or decrypts a range of it.
+
+Example:
+    $ python random_access.py index archive.txt
+    $ python random_access.py decrypt archive.txt --start 5000000000 \\
+          --stop 5000004096 --rotors I II III --positions DEF --rings ABC
+"""
+
+import argparse
+import mmap
+import os
+import string
+import struct
+
+from key_search import TrialDecryptor, numbers_to_text, text_to_numbers
+from stepping_schedule import SteppingSchedule
+
+# Bytes that turn the rotors.
+LETTERS = string.ascii_letters.encode()
+_LETTER_SET = frozenset(LETTERS)
+_NOT_LETTERS = bytes(byte for byte in range(256) if byte not in _LETTER_SET)
+# Translates letters to their letter numbers.
+_LETTER_NUMBERS = bytes.maketrans(
+    LETTERS, bytes(range(26)) + bytes(range(26)))
+# Magic, block size, file size and file modification time (nanoseconds).
+_INDEX_HEADER = struct.Struct('<8sQQQ')
+_INDEX_MAGIC = b'ENIGMAI2'
+
+
+def count_letters(data):
+    """
+    The number of letters in a bytes-like object.
+    """
+    return len(data) - len(bytes(data).translate(None, LETTERS))
+
+
+def index_path_for(path):
+    """
+    The default path of a file's index.
+    """
+    return f'{path}.idx'
+
+
+def build_index(path, index_path=None, block_size=1 << 20):
+    """
+    Indexes a file in one streaming pass.
+
+    The index holds the block size, the file's size and modification time
+    and, for each block, the number of letters before it, followed by the
+    total number of letters.
+
+    Arguments:
+        path (str): File to index.
+        index_path (str): Where to write the index. Defaults to the file's
+                          path with ".idx" added.
+        block_size (int): Bytes per block. Smaller blocks make the index
+                          bigger but lookups faster.
+
+    Returns:
+        index_path (str): Where the index was written.
+    """
+    if block_size < 1:
+        raise ValueError('Block size must be positive')
+    if index_path is None:
+        index_path = index_path_for(path)
+    counts = [0]
+    size = 0
+    with open(path, 'rb') as data_file:
+        # Taken before reading, so a change while indexing makes the index
+        # out of date.
+        modified = os.fstat(data_file.fileno()).st_mtime_ns
+        while True:
+            block = data_file.read(block_size)
+            if not block:
+                break
+            size += len(block)
+            counts.append(counts[-1] + count_letters(block))
+    if len(counts) == 1:
+        counts.append(0)
+
+    temporary_path = f'{index_path}.tmp'
+    with open(temporary_path, 'wb') as index_file:
+        index_file.write(_INDEX_HEADER.pack(_INDEX_MAGIC, block_size, size,
+                                            modified))
+        index_file.write(struct.pack(f'<{len(counts)}Q', *counts))
+        index_file.flush()
+        os.fsync(index_file.fileno())
+    os.replace(temporary_path, index_path)
+
+    return index_path
+
+
+def load_index(path, index_path=None):
+    """
+    Loads a file's index, checking it belongs to the file as it is now.
+
+    Returns:
+        block_size (int): Bytes per block.
+        counts (tuple): Letters before each block, then the total.
+
+    Raises:
+        ValueError if the index is invalid or the file has changed size or
+        been modified since it was built.
+    """
+    if index_path is None:
+        index_path = index_path_for(path)
+    with open(index_path, 'rb') as index_file:
+        header = index_file.read(_INDEX_HEADER.size)
+        body = index_file.read()
+    if len(header) != _INDEX_HEADER.size or len(body) % 8:
+        raise ValueError('Invalid index')
+    magic, block_size, size, modified = _INDEX_HEADER.unpack(header)
+    counts = struct.unpack(f'<{len(body) // 8}Q', body)
+    if magic != _INDEX_MAGIC or block_size < 1 or \
+       len(counts) != max(-(-size // block_size), 1) + 1:
+        raise ValueError('Invalid index')
+    status = os.stat(path)
+    if size != status.st_size or modified != status.st_mtime_ns:
+        raise ValueError('Index is out of date, rebuild it')
+
+    return block_size, counts
+
+
+class RandomAccessReader:
+    """
+    A class to decrypt any range of an indexed ciphertext file.
+
+    Attributes:
+        path: (str)
+            The ciphertext file.
+        size: (int)
+            Size of the file in bytes.
+        letters: (int)
+            Number of letters in the file.
+    """
+    def __init__(self, path, rotor_types, rotor_positions, ring_settings,
+                 reflector_mapping='B', steckered_pairing='',
+                 index_path=None):
+        """
+        Opens a file and its index. The machine settings are those the file
+        was encrypted with, starting from its first byte.
+        Args:
+            path (str): The ciphertext file.
+            rotor_types (lst): List of types of rotor in the machine.
+            rotor_positions (str): Rotor positions at the start of the file.
+            ring_settings (str): Ring settings of the rotors.
+            reflector_mapping (str): As for EnigmaMachine.
+            steckered_pairing (str): As for EnigmaMachine.
+            index_path (str): The file's index, see build_index.
+
+        Raises:
+            ValueError if any of the settings or the index are invalid.
+        """
+        self.path = path
+        self._block_size, self._counts = load_index(path, index_path)
+        self.size = os.path.getsize(path)
+        self.letters = self._counts[-1]
+        self._decryptor = TrialDecryptor(rotor_types, reflector_mapping,
+                                         steckered_pairing)
+        positions = text_to_numbers(rotor_positions)
+        self._rings = text_to_numbers(ring_settings)
+        if len(positions) != len(rotor_types) or \
+           len(self._rings) != len(rotor_types):
+            raise ValueError('Number of rotor positions and ring settings '
+                             'must match with number of rotors')
+        self._schedule = SteppingSchedule(self._decryptor.notches, positions)
+        with open(path, 'rb') as data_file:
+            # An empty file can't be mapped.
+            self._data = b'' if self.size == 0 else \
+                mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def letters_before(self, offset):
+        """
+        The number of letters before a byte offset, from the index and at
+        most one block of the file.
+        """
+        if not 0 <= offset <= self.size:
+            raise IndexError(f'Offset {offset} is outside the file')
+        block = offset // self._block_size
+        start = block * self._block_size
+        return self._counts[block] + count_letters(self._data[start:offset])
+
+    def rotor_positions_at(self, offset):
+        """
+        The rotor positions after the letters before a byte offset have been
+        typed, as a string.
+        """
+        return numbers_to_text(self._schedule.positions_at(
+            self.letters_before(offset)))
+
+    def decrypt_range(self, start, stop):
+        """
+        Decrypts part of the file.
+
+        Arguments:
+            start (int): Byte offset to start at.
+            stop (int): Byte offset to stop before.
+
+        Returns:
+            decrypted (str): The decrypted bytes, as text. Letters come out
+                             upper case and other bytes are unchanged (read
+                             as Latin-1).
+        """
+        stop = min(stop, self.size)
+        if start >= stop:
+            return ''
+        positions = self._schedule.positions_at(self.letters_before(start))
+        data = bytes(self._data[start:stop])
+        numbers = data.translate(None, _NOT_LETTERS).translate(
+            _LETTER_NUMBERS)
+        decrypted = iter(self._decryptor.decrypt(numbers, positions,
+                                                 self._rings))
+        output = bytes(next(decrypted) + 65 if byte in _LETTER_SET else byte
+                       for byte in data)
+
+        return output.decode('latin-1')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Index or decrypt part of a large ciphertext file.')
+    parser.add_argument('command', choices=['index', 'decrypt'])
+    parser.add_argument('path')
+    parser.add_argument('--index')
+    parser.add_argument('--block-size', type=int, default=1 << 20)
+    parser.add_argument('--start', type=int, default=0)
+    parser.add_argument('--stop', type=int)
+    parser.add_argument('--rotors', nargs='+', default=['I', 'II', 'III'])
+    parser.add_argument('--positions', default='AAA')
+    parser.add_argument('--rings', default='AAA')
+    parser.add_argument('--reflector', default='B')
+    parser.add_argument('--plugboard', default='')
+    args = parser.parse_args()
+
+    if args.command == 'index':
+        print(build_index(args.path, args.index, args.block_size))
+    else:
+        with RandomAccessReader(args.path, args.rotors, args.positions,
+                                args.rings, args.reflector, args.plugboard,
+                                args.index) as reader:
+            stop = reader.size if args.stop is None else args.stop
+            print(reader.decrypt_range(args.start, stop))
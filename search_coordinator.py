@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""Distributed Enigma key search.
+
+A coordinator hands out the work units of a key_search.KeySearch to any
+number of worker processes, on this or other machines, over a simple
+socket protocol, and merges the candidates they send back.
+
+The protocol is newline-delimited JSON. On connecting, a worker is sent the
+search parameters, then one work unit at a time:
+
+    coordinator -> worker  {"type": "search", "parameters": {...}}
+    coordinator -> worker  {"type": "unit", "id": 17, "threshold": -2.9}
+    worker -> coordinator  {"type": "result", "id": 17, "candidates": [...]}
+    ...
+    coordinator -> worker  {"type": "done"}
+
+The threshold is the score of the worst of the best candidates found so far
+(null until there are enough), so workers can drop trials that can't make
+them, see KeySearch.run_unit.
+
+If a worker disconnects, or takes longer than the unit timeout to send back
+a result, its unit is handed to another worker.
+
+Ran as a script it starts a coordinator or a worker.
+
+Rotor orders are given as comma separated rotor types. With --naval the
+reflectors are the thin reflectors of a four rotor naval machine, folded
+together with each Greek rotor setting, and the Greek rotor and thin
+reflector of each candidate are printed after it.
+
+Example:
+    $ python search_coordinator.py coordinator --ciphertext SDHOJGSMAY \\
+          --port 5005 --checkpoint search.json
+    $ python search_coordinator.py coordinator --ciphertext SDHOJGSMAY \\
+          --rotor-orders II,IV,I IV,II,I --naval --score letter_frequency
+    $ python search_coordinator.py worker --host 10.0.0.1 --port 5005
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+from collections import deque
+
+from key_search import SCORES, KeySearch, folded_reflectors, merge_candidates
+
+
+def send_message(stream, message):
+    """
+    Writes a message to a socket file as a line of JSON.
+    """
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+
+def receive_message(stream):
+    """
+    Reads a line of JSON from a socket file.
+
+    Raises:
+        ConnectionError if the other end has disconnected.
+    """
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('Connection closed')
+
+    return json.loads(line)
+
+
+class Coordinator:
+    """
+    A class to represent the coordinator of a distributed key search.
+
+    Attributes:
+        search: (key_search.KeySearch)
+            The search being run.
+        address: (tuple)
+            Host and port the coordinator listens on.
+        unit_timeout: (float)
+            Seconds a worker has to return a unit's result before the unit
+            is handed to another worker.
+        checkpoint_path: (str)
+            Checkpoint file, as for KeySearch.run.
+    """
+    def __init__(self, search, host='127.0.0.1', port=0, unit_timeout=600,
+                 checkpoint_path=None):
+        """
+        Initialises a Coordinator and starts listening for workers. Port 0
+        picks a free port, which can be read from the address attribute.
+        Args:
+            search (key_search.KeySearch): The search to run.
+            host (str): Interface to listen on.
+            port (int): Port to listen on.
+            unit_timeout (float): Seconds before a unit is reassigned.
+            checkpoint_path (str): Checkpoint file, resumed from if it
+                                   exists.
+        """
+        self.search = search
+        self.unit_timeout = unit_timeout
+        self.checkpoint_path = checkpoint_path
+        self._units = search.work_units()
+        self._completed = set()
+        self._candidates = []
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self._completed, self._candidates = \
+                search.load_checkpoint(checkpoint_path)
+        self._pending = deque(unit_id for unit_id in range(len(self._units))
+                              if unit_id not in self._completed)
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._listener = socket.create_server((host, port))
+        self.address = self._listener.getsockname()
+
+    def _next_unit(self):
+        """
+        Takes the next unit to hand out, waiting while all remaining units
+        are in flight in case their workers are lost.
+
+        Returns:
+            unit_id (int): Id of the unit, or None if the search is done.
+            threshold (float): Score a trial must reach to make the best
+                               candidates so far, or None.
+        """
+        with self._condition:
+            while not self._pending and self._in_flight:
+                self._condition.wait()
+            if not self._pending:
+                return None, None
+            unit_id = self._pending.popleft()
+            self._in_flight.add(unit_id)
+            threshold = None
+            if len(self._candidates) >= self.search.top:
+                threshold = self._candidates[self.search.top - 1][0]
+
+            return unit_id, threshold
+
+    def _release(self, unit_id):
+        """
+        Returns a unit whose worker was lost to the pending queue.
+        """
+        with self._condition:
+            self._in_flight.discard(unit_id)
+            if unit_id not in self._completed:
+                self._pending.appendleft(unit_id)
+            self._condition.notify_all()
+
+    def _complete(self, unit_id, candidates):
+        """
+        Records a unit's result and merges its candidates into the ranking.
+        """
+        with self._condition:
+            self._in_flight.discard(unit_id)
+            if unit_id not in self._completed:
+                self._completed.add(unit_id)
+                self._candidates = merge_candidates(
+                    self._candidates + candidates, self.search.top)
+                if self.checkpoint_path is not None:
+                    self.search.save_checkpoint(self.checkpoint_path,
+                                                self._completed,
+                                                self._candidates)
+            self._condition.notify_all()
+
+    def _serve_worker(self, connection):
+        """
+        Hands out units to a single worker until the search is done or the
+        worker is lost.
+        """
+        connection.settimeout(self.unit_timeout)
+        with connection, connection.makefile('rwb') as stream:
+            unit_id = None
+            try:
+                send_message(stream, {'type': 'search',
+                                      'parameters': self.search.parameters()})
+                while True:
+                    unit_id, threshold = self._next_unit()
+                    if unit_id is None:
+                        send_message(stream, {'type': 'done'})
+                        return
+                    send_message(stream, {'type': 'unit', 'id': unit_id,
+                                          'threshold': threshold})
+                    message = receive_message(stream)
+                    if message.get('type') != 'result' or \
+                       message.get('id') != unit_id:
+                        raise ConnectionError('Unexpected message from '
+                                              'worker')
+                    self._complete(unit_id, message['candidates'])
+                    unit_id = None
+            except (OSError, ValueError):
+                # Timeouts, disconnections and garbled messages all mean the
+                # worker is lost.
+                if unit_id is not None:
+                    self._release(unit_id)
+
+    def _accept_workers(self):
+        """
+        Accepts worker connections, serving each on its own thread.
+        """
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except OSError:
+                # The listener has been closed.
+                return
+            threading.Thread(target=self._serve_worker, args=(connection,),
+                             daemon=True).start()
+
+    def run(self):
+        """
+        Runs the search, returning once every unit has a result.
+
+        Returns:
+            candidates (lst): The best candidates found, best first.
+        """
+        threading.Thread(target=self._accept_workers, daemon=True).start()
+        with self._condition:
+            while len(self._completed) < len(self._units):
+                self._condition.wait()
+        self._listener.close()
+
+        return self._candidates
+
+    def progress(self):
+        """
+        The number of completed and total work units.
+        """
+        with self._condition:
+            return len(self._completed), len(self._units)
+
+
+def run_worker(host, port):
+    """
+    Connects to a coordinator and runs work units until it says the search
+    is done.
+
+    Arguments:
+        host (str): Coordinator host.
+        port (int): Coordinator port.
+
+    Returns:
+        units_run (int): Number of units this worker ran.
+    """
+    units_run = 0
+    with socket.create_connection((host, port)) as connection, \
+            connection.makefile('rwb') as stream:
+        message = receive_message(stream)
+        search = KeySearch(**message['parameters'])
+        units = search.work_units()
+        while True:
+            message = receive_message(stream)
+            if message['type'] == 'done':
+                return units_run
+            candidates = search.run_unit(units[message['id']],
+                                         message.get('threshold'))
+            send_message(stream, {'type': 'result', 'id': message['id'],
+                                  'candidates': [list(candidate) for
+                                                 candidate in candidates]})
+            units_run += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed key search.')
+    subparsers = parser.add_subparsers(dest='role', required=True)
+    coordinator_parser = subparsers.add_parser('coordinator')
+    coordinator_parser.add_argument('--ciphertext', required=True)
+    coordinator_parser.add_argument('--rotor-orders', nargs='+')
+    coordinator_parser.add_argument('--reflectors', nargs='+')
+    coordinator_parser.add_argument('--naval', action='store_true')
+    coordinator_parser.add_argument('--score', choices=sorted(SCORES),
+                                    default='index_of_coincidence')
+    coordinator_parser.add_argument('--top', type=int, default=10)
+    coordinator_parser.add_argument('--tolerance', type=float)
+    coordinator_parser.add_argument('--host', default='0.0.0.0')
+    coordinator_parser.add_argument('--port', type=int, default=5005)
+    coordinator_parser.add_argument('--unit-timeout', type=float,
+                                    default=600)
+    coordinator_parser.add_argument('--checkpoint')
+    worker_parser = subparsers.add_parser('worker')
+    worker_parser.add_argument('--host', default='127.0.0.1')
+    worker_parser.add_argument('--port', type=int, default=5005)
+    args = parser.parse_args()
+
+    if args.role == 'coordinator':
+        rotor_orders = None
+        if args.rotor_orders is not None:
+            rotor_orders = [order.split(',') for order in args.rotor_orders]
+        reflectors = args.reflectors
+        folded = {}
+        if args.naval:
+            folded = folded_reflectors(
+                thin_reflectors=reflectors or ('B-thin', 'C-thin'))
+            reflectors = list(folded)
+        coordinator = Coordinator(
+            KeySearch(args.ciphertext, rotor_orders=rotor_orders,
+                      reflectors=reflectors or ['B'], top=args.top,
+                      score=args.score, tolerance=args.tolerance),
+            host=args.host, port=args.port, unit_timeout=args.unit_timeout,
+            checkpoint_path=args.checkpoint)
+        print(f'Coordinator listening on {coordinator.address}')
+        for candidate in coordinator.run():
+            # (greek_rotor_type, greek_setting, thin_reflector) with --naval.
+            print(candidate, *folded.get(candidate[2], ()))
+    else:
+        print(f'Worker ran {run_worker(args.host, args.port)} units.')
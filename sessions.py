@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""Compact Enigma machines for holding very many sessions at once.
+
+An EnigmaMachine keeps its own Rotor, Reflector and Plugboard objects, which
+costs around a kilobyte per machine. Most of that is wiring, which is the
+same for every machine with the same configuration. Here the wiring lives in a
+MachineWiring shared by reference between all sessions with that
+configuration, and a session holds only its rotor positions:
+
+    * Session is a two-slot object, costing tens of bytes.
+    * SessionStore packs every session into one bytearray, costing two bytes
+      plus one byte per rotor for each session.
+
+Example:
+    wiring = MachineWiring.shared(['I', 'II', 'III'], 'ABC', 'B', 'AM FI')
+    session = Session(wiring, 'DEF')
+    session.encrypt_message('HELLO')
+"""
+
+from array import array
+from weakref import WeakValueDictionary
+
+from key_search import (TrialDecryptor, fill_letters, message_numbers,
+                        numbers_to_text, text_to_numbers)
+
+
+class MachineWiring:
+    """
+    A class to represent the fixed parts of an Enigma Machine configuration:
+    rotor types, ring settings, reflector and plugboard. It holds no rotor
+    positions, so one instance can be shared by any number of sessions.
+
+    Attributes:
+        rotor_types: (tuple)
+            Types of rotor in the machine, left-most first.
+        ring_settings: (str)
+            Ring settings of the rotors.
+        reflector_mapping: (str)
+            Reflector, as for EnigmaMachine.
+        steckered_pairing: (str)
+            Plugboard, as for EnigmaMachine.
+    """
+    __slots__ = ('rotor_types', 'ring_settings', 'reflector_mapping',
+                 'steckered_pairing', '_decryptor', '_rings', '__weakref__')
+
+    # Wirings handed out by shared(), by configuration.
+    _shared = WeakValueDictionary()
+
+    def __init__(self, rotor_types, ring_settings, reflector_mapping='B',
+                 steckered_pairing=''):
+        """
+        Initialises a MachineWiring. Use shared() instead to reuse an
+        existing wiring with the same configuration.
+        Args:
+            rotor_types (lst): List of types of rotor in the machine.
+            ring_settings (str): Ring settings of the rotors.
+            reflector_mapping (str): As for EnigmaMachine.
+            steckered_pairing (str): As for EnigmaMachine.
+
+        Raises:
+            ValueError if any of the settings are invalid.
+        """
+        rings = text_to_numbers(ring_settings)
+        if len(rings) != len(rotor_types) or \
+           len(ring_settings) != len(rotor_types):
+            raise ValueError('Number of ring settings must match with number '
+                             'of rotors')
+        self.rotor_types = tuple(rotor_types)
+        self.ring_settings = ring_settings.upper()
+        self.reflector_mapping = reflector_mapping
+        self.steckered_pairing = steckered_pairing or ''
+        self._decryptor = TrialDecryptor(rotor_types, reflector_mapping,
+                                         self.steckered_pairing)
+        self._rings = rings
+
+    @classmethod
+    def shared(cls, rotor_types, ring_settings, reflector_mapping='B',
+               steckered_pairing=''):
+        """
+        Gets the wiring for a configuration, reusing an existing one if any
+        session still uses it.
+        """
+        key = (tuple(rotor_types), ring_settings.upper(),
+               reflector_mapping.upper(), steckered_pairing or '')
+        wiring = cls._shared.get(key)
+        if wiring is None:
+            wiring = cls(*key)
+            cls._shared[key] = wiring
+
+        return wiring
+
+    def __repr__(self):
+        return (f'MachineWiring(rotor_types={list(self.rotor_types)}, '
+                f'ring_settings={self.ring_settings!r}, '
+                f'reflector_mapping={self.reflector_mapping!r}, '
+                f'steckered_pairing={self.steckered_pairing!r})')
+
+    def encrypt(self, message, positions):
+        """
+        Encrypts a message starting from the given rotor positions. Like
+        EnigmaMachine.encrypt_message it skips any characters that aren't
+        letters.
+
+        Arguments:
+            message (str): Message to be encrypted.
+            positions (lst): Rotor position numbers. Updated in place to the
+                             final rotor positions.
+
+        Returns:
+            encrypted_message (str): The encrypted message.
+
+        Raises:
+            ValueError if the message is not a string or contains letters
+            other than A to Z.
+        """
+        if type(message) != str:
+            raise ValueError
+        encrypted = self._decryptor.decrypt(message_numbers(message),
+                                            positions, self._rings)
+
+        return fill_letters(message, encrypted)
+
+
+def pack_positions(positions):
+    """
+    Packs rotor position numbers into a single integer, left-most rotor in
+    the most significant place.
+    """
+    state = 0
+    for position in positions:
+        state = state * 26 + position
+
+    return state
+
+
+def unpack_positions(state, num_rotors):
+    """
+    Unpacks rotor position numbers packed by pack_positions.
+    """
+    positions = [0] * num_rotors
+    for i in reversed(range(num_rotors)):
+        state, positions[i] = divmod(state, 26)
+
+    return positions
+
+
+class Session:
+    """
+    A class to represent one user's Enigma Machine: a shared wiring and the
+    session's own rotor positions, packed into a single integer.
+
+    Attributes:
+        wiring: (MachineWiring)
+            The machine configuration.
+        state: (int)
+            The rotor positions, packed by pack_positions.
+    """
+    __slots__ = ('wiring', 'state')
+
+    def __init__(self, wiring, rotor_positions):
+        """
+        Initialises a Session.
+        Args:
+            wiring (MachineWiring): The machine configuration.
+            rotor_positions (str): Initial positions of the rotors.
+
+        Raises:
+            ValueError if the number of positions doesn't match the wiring.
+        """
+        positions = text_to_numbers(rotor_positions)
+        if len(positions) != len(wiring.rotor_types) or \
+           len(rotor_positions) != len(wiring.rotor_types):
+            raise ValueError('Number of rotor positions must match with '
+                             'number of rotors')
+        self.wiring = wiring
+        self.state = pack_positions(positions)
+
+    @property
+    def rotor_positions(self):
+        """
+        The current rotor positions as a string.
+        """
+        return numbers_to_text(unpack_positions(
+            self.state, len(self.wiring.rotor_types)))
+
+    def encrypt_message(self, message):
+        """
+        Encrypts a message, turning the session's rotors as it goes.
+        See MachineWiring.encrypt.
+        """
+        positions = unpack_positions(self.state, len(self.wiring.rotor_types))
+        encrypted_message = self.wiring.encrypt(message, positions)
+        self.state = pack_positions(positions)
+
+        return encrypted_message
+
+
+# Wiring index marking the record of a removed session.
+_REMOVED = 0xffff
+
+
+class SessionStore:
+    """
+    A class to hold many sessions packed into a single bytearray. Each
+    session is a record of a two byte wiring index followed by one byte per
+    rotor position, and is referred to by its number. The records of
+    removed sessions are reused by later ones, so a session's number can
+    be handed out again once it has been removed.
+
+    Attributes:
+        num_rotors: (int)
+            Number of rotors in every session's machine.
+    """
+    def __init__(self, num_rotors=3):
+        """
+        Initialises an empty SessionStore.
+        Args:
+            num_rotors (int): Number of rotors in every session's machine.
+        """
+        self.num_rotors = num_rotors
+        self._record_size = num_rotors + 2
+        self._records = bytearray()
+        self._wirings = []
+        self._wiring_indices = {}
+        # Numbers of removed sessions, whose records are free.
+        self._free = array('I')
+
+    def __len__(self):
+        return len(self._records) // self._record_size - len(self._free)
+
+    def add(self, wiring, rotor_positions):
+        """
+        Adds a session.
+
+        Arguments:
+            wiring (MachineWiring): The session's machine configuration.
+            rotor_positions (str): Initial positions of the rotors.
+
+        Returns:
+            session_id (int): Number of the new session.
+
+        Raises:
+            ValueError if the wiring or positions don't have the store's
+            number of rotors, or the store has run out of wiring indices.
+        """
+        positions = text_to_numbers(rotor_positions)
+        if len(wiring.rotor_types) != self.num_rotors or \
+           len(positions) != self.num_rotors or \
+           len(rotor_positions) != self.num_rotors:
+            raise ValueError('Number of rotors must match with the store')
+        if wiring not in self._wiring_indices:
+            if len(self._wirings) == _REMOVED:
+                raise ValueError('Too many different wirings in the store')
+            self._wiring_indices[wiring] = len(self._wirings)
+            self._wirings.append(wiring)
+        record = self._wiring_indices[wiring].to_bytes(2, 'little') + \
+            bytes(positions)
+        if self._free:
+            session_id = self._free.pop()
+            start = session_id * self._record_size
+            self._records[start:start + self._record_size] = record
+        else:
+            session_id = len(self._records) // self._record_size
+            self._records += record
+
+        return session_id
+
+    def remove(self, session_id):
+        """
+        Removes a session, freeing its record for a later session. Its
+        wiring stays in the store.
+
+        Raises:
+            IndexError if there is no such session.
+        """
+        start = self._record(session_id)
+        self._records[start:start + 2] = _REMOVED.to_bytes(2, 'little')
+        self._free.append(session_id)
+
+    def _record(self, session_id):
+        """
+        The offset of a session's record, checking the session exists.
+        """
+        start = session_id * self._record_size
+        if not 0 <= start < len(self._records) or int.from_bytes(
+                self._records[start:start + 2], 'little') == _REMOVED:
+            raise IndexError(f'No session {session_id}')
+
+        return start
+
+    def wiring(self, session_id):
+        """
+        The machine configuration of a session.
+        """
+        start = self._record(session_id)
+        return self._wirings[int.from_bytes(self._records[start:start + 2],
+                                            'little')]
+
+    def rotor_positions(self, session_id):
+        """
+        The current rotor positions of a session as a string.
+        """
+        start = self._record(session_id) + 2
+        return numbers_to_text(self._records[start:start + self.num_rotors])
+
+    def encrypt_message(self, session_id, message):
+        """
+        Encrypts a message with a session's machine, turning its rotors as
+        it goes. See MachineWiring.encrypt.
+        """
+        start = self._record(session_id) + 2
+        positions = list(self._records[start:start + self.num_rotors])
+        encrypted_message = self.wiring(session_id).encrypt(message,
+                                                            positions)
+        self._records[start:start + self.num_rotors] = bytes(positions)
+
+        return encrypted_message
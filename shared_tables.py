@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""Enigma tables in shared memory for process pools.
+
+Fanning Enigma work out over multiprocessing normally means every worker
+builds (or unpickles) its own rotor and reflector tables. Here the tables are
+built once, in the parent, into a single multiprocessing.shared_memory
+segment:
+
+    * the wiring of every rotor type at every offset,
+    * the reflectors, and
+    * for each requested three rotor order and reflector, the reflection
+      through the reflector and left-most two rotors for every pair of left
+      and middle rotor offsets (so encrypting a letter needs no composing).
+
+Workers are only given a small picklable TableHandle naming the segment.
+Attaching to it is near-instant and the tables are never copied, so memory
+use doesn't grow with the number of workers.
+
+The segment is removed when the SharedTables is closed, when it is garbage
+collected or the interpreter exits, and (through multiprocessing's resource
+tracker) even if the parent process is killed. Workers only ever attach, so
+a worker crashing has no effect on it.
+
+Example:
+    with SharedTables(rotor_orders=[('I', 'II', 'III')]) as tables, \\
+            SharedTablePool(tables, processes=8) as pool:
+        results = pool.encrypt_messages(jobs)
+"""
+
+import weakref
+from collections import namedtuple
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+from enigma_machine import GREEK_ROTOR_TYPES, EnigmaMachine
+from key_search import (encrypt_numbers, fill_letters, message_numbers,
+                        numbers_to_text, rotor_tables, text_to_numbers)
+
+ROTOR_TYPES = ['I', 'II', 'III', 'IV', 'V']
+REFLECTORS = ['A', 'B', 'C']
+
+# Where each table is in a segment: a segment name, its size and a
+# dictionary of table keys to (start, length) pairs, plus rotor notches.
+TableHandle = namedtuple('TableHandle', ['name', 'size', 'layout', 'notches'])
+
+# An encryption for a pool to run. Any object with these attributes will do.
+Job = namedtuple('Job', ['rotor_types', 'rotor_positions', 'ring_settings',
+                         'reflector_mapping', 'steckered_pairing', 'message'])
+
+
+def _attach(name):
+    """
+    Attaches to an existing segment without registering it with this
+    process's resource tracker, which would otherwise remove the segment
+    when a worker exits.
+    """
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching processes can't opt out of tracking.
+        return SharedMemory(name=name)
+
+
+def _release(shared_memory, unlink, views=()):
+    """
+    Releases views onto a segment (anything with a release method), then
+    closes (and optionally removes) the segment, ignoring a segment that has
+    already gone. The segment is removed even if it can't be closed.
+    """
+    try:
+        for view in list(views):
+            view.release()
+        try:
+            shared_memory.close()
+        except BufferError:
+            # Something else still holds a memoryview onto the segment, so
+            # it stays mapped until that is garbage collected.
+            pass
+    finally:
+        if unlink:
+            try:
+                shared_memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedTables:
+    """
+    A class to represent Enigma tables held in a shared memory segment
+    created by this process.
+
+    Attributes:
+        handle: (TableHandle)
+            Picklable handle for attaching to the tables from workers.
+    """
+    def __init__(self, rotor_orders=(), reflectors=REFLECTORS,
+                 rotor_types=ROTOR_TYPES):
+        """
+        Builds the tables and copies them into a new shared memory segment.
+        Args:
+            rotor_orders (lst): Three rotor orders to build reflection
+                                tables for. Each costs 17,576 bytes per
+                                reflector.
+            reflectors (lst): Reflector mappings to include.
+            rotor_types (lst): Rotor types to include.
+        """
+        tables = {}
+        notches = {}
+        for rotor_type in rotor_types:
+            forward, reverse, notch = rotor_tables(rotor_type)
+            tables[f'forward {rotor_type}'] = b''.join(map(bytes, forward))
+            tables[f'reverse {rotor_type}'] = b''.join(map(bytes, reverse))
+            notches[rotor_type] = notch
+        for reflector_mapping in reflectors:
+            reflector = EnigmaMachine.Reflector(reflector_mapping).wiring()
+            tables[f'reflector {reflector_mapping}'] = bytes(reflector)
+            for rotor_order in rotor_orders:
+                tables[_stack_key(rotor_order, reflector_mapping)] = \
+                    _stack_table(rotor_order, reflector)
+
+        layout = {}
+        size = 0
+        for key, table in tables.items():
+            layout[key] = (size, len(table))
+            size += len(table)
+        self._shared_memory = SharedMemory(create=True, size=max(size, 1))
+        for key, table in tables.items():
+            start, length = layout[key]
+            self._shared_memory.buf[start:start + length] = table
+        self.handle = TableHandle(self._shared_memory.name, size, layout,
+                                  notches)
+        # Views made by view(), released before the segment is closed.
+        self._views = weakref.WeakSet()
+        self._finalizer = weakref.finalize(self, _release,
+                                           self._shared_memory, True,
+                                           self._views)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Removes the segment. Workers still attached keep their mapping until
+        they detach, but no new workers can attach. Views from view(), and
+        tables from them, can't be used afterwards.
+        """
+        self._finalizer()
+
+    def view(self):
+        """
+        A TableView of the tables for use in this process.
+        """
+        view = TableView(self.handle, self._shared_memory)
+        self._views.add(view)
+        return view
+
+
+def _stack_key(rotor_order, reflector_mapping):
+    """
+    Layout key of a rotor order's reflection table.
+    """
+    return f'stack {" ".join(rotor_order)} {reflector_mapping}'
+
+
+def _stack_table(rotor_order, reflector):
+    """
+    The reflection through the reflector and the left-most two rotors of a
+    three rotor order, for every left and middle rotor offset. Entry
+    (26 * left + middle) * 26 + number is where letter number is reflected
+    to.
+    """
+    (left_forward, left_reverse, _), (middle_forward, middle_reverse, _) = \
+        [rotor_tables(rotor_type) for rotor_type in rotor_order[:2]]
+    table = bytearray()
+    for left in range(26):
+        left_reflection = [left_reverse[left][reflector[
+            left_forward[left][number]]] for number in range(26)]
+        for middle in range(26):
+            table += bytes(middle_reverse[middle][left_reflection[
+                middle_forward[middle][number]]] for number in range(26))
+
+    return bytes(table)
+
+
+class TableView:
+    """
+    A class to read the tables in a shared memory segment. All tables are
+    memoryviews onto the segment, so nothing is copied, and are only valid
+    until the view is released.
+    """
+    def __init__(self, handle, shared_memory=None):
+        """
+        Attaches to a segment.
+        Args:
+            handle (TableHandle): Handle of the segment.
+            shared_memory (SharedMemory): The segment, if this process
+                                          already has it open.
+        """
+        attached = shared_memory is None
+        if attached:
+            shared_memory = _attach(handle.name)
+        self.handle = handle
+        self._buffer = memoryview(shared_memory.buf)
+        self._tables = {}
+        # Every memoryview handed out, so they can all be released.
+        self._views = [self._buffer]
+        if attached:
+            weakref.finalize(self, _release, shared_memory, False,
+                             self._views)
+
+    def release(self):
+        """
+        Releases the view's memoryviews onto the segment, so the segment can
+        be closed.
+        """
+        for view in self._views:
+            view.release()
+
+    def table(self, key):
+        """
+        A table by layout key, or None if the segment doesn't have it.
+        """
+        if key not in self.handle.layout:
+            return None
+        if key not in self._tables:
+            start, length = self.handle.layout[key]
+            table = self._buffer[start:start + length]
+            self._tables[key] = table
+            self._views.append(table)
+        return self._tables[key]
+
+    def encrypt(self, job):
+        """
+        Encrypts a job's message as EnigmaMachine.encrypt_message would,
+        using only the shared tables (apart from the plugboard, and any
+        reflector or rotor type missing from them).
+
+        Arguments:
+            job (Job): What to encrypt.
+
+        Returns:
+            encrypted_message (str): The encrypted message.
+            rotor_positions (str): The final rotor positions.
+
+        Raises:
+            ValueError if the settings are invalid. A Greek rotor has to be
+            folded into the reflector instead, see
+            key_search.folded_reflectors.
+        """
+        rotor_types = list(job.rotor_types)
+        if any(rotor_type in GREEK_ROTOR_TYPES for rotor_type in rotor_types):
+            raise ValueError('Greek rotors must be folded into the reflector')
+        positions = text_to_numbers(job.rotor_positions)
+        rings = text_to_numbers(job.ring_settings)
+        if len(positions) != len(rotor_types) or \
+           len(rings) != len(rotor_types):
+            raise ValueError('Number of rotor positions and ring settings '
+                             'must match with number of rotors')
+        forward = []
+        reverse = []
+        notches = []
+        for rotor_type in rotor_types:
+            if rotor_type in self.handle.notches:
+                forward.append(self.table(f'forward {rotor_type}'))
+                reverse.append(self.table(f'reverse {rotor_type}'))
+                notches.append(self.handle.notches[rotor_type])
+            else:
+                tables = rotor_tables(rotor_type)
+                forward.append(b''.join(map(bytes, tables[0])))
+                reverse.append(b''.join(map(bytes, tables[1])))
+                notches.append(tables[2])
+        reflector = self.table(f'reflector {job.reflector_mapping}')
+        if reflector is None:
+            reflector = EnigmaMachine.Reflector(
+                job.reflector_mapping).wiring()
+        stack = None
+        if len(rotor_types) == 3:
+            stack = self.table(_stack_key(rotor_types,
+                                          job.reflector_mapping))
+        plugboard = EnigmaMachine.Plugboard(
+            job.steckered_pairing or '').wiring()
+
+        def reflection(positions):
+            # The reflection through every rotor but the right-most one.
+            if stack is not None:
+                start = (((positions[0] - rings[0]) % 26) * 26
+                         + (positions[1] - rings[1]) % 26) * 26
+                return stack[start:start + 26]
+            composed = reflector
+            for i in range(len(positions) - 1):
+                start = ((positions[i] - rings[i]) % 26) * 26
+                composed = [reverse[i][start + composed[forward[i][start
+                                                                   + number]]]
+                            for number in range(26)]
+            return composed
+
+        # The right-most rotor's wiring at each offset.
+        right_forward = [forward[-1][start:start + 26]
+                         for start in range(0, 26 * 26, 26)]
+        right_reverse = [reverse[-1][start:start + 26]
+                         for start in range(0, 26 * 26, 26)]
+        encrypted = encrypt_numbers(message_numbers(job.message), positions,
+                                    notches, right_forward, right_reverse,
+                                    rings[-1], plugboard, reflection)
+
+        return fill_letters(job.message, encrypted), numbers_to_text(positions)
+
+
+# Tables attached to by a pool worker, see _initialise_worker.
+_worker_view = None
+
+
+def _initialise_worker(handle):
+    """
+    Attaches a pool worker to the shared tables.
+    """
+    global _worker_view
+    _worker_view = TableView(handle)
+
+
+def _encrypt_in_worker(job):
+    """
+    Encrypts a job in a pool worker.
+    """
+    return _worker_view.encrypt(job)
+
+
+class SharedTablePool:
+    """
+    A class to represent a process pool whose workers encrypt using shared
+    tables.
+    """
+    def __init__(self, tables, processes=None):
+        """
+        Starts the workers, each attaching to the tables.
+        Args:
+            tables (SharedTables): Tables for the workers to use.
+            processes (int): Number of workers, defaults to the CPU count.
+        """
+        self._pool = Pool(processes, initializer=_initialise_worker,
+                          initargs=(tables.handle,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Stops the workers.
+        """
+        self._pool.terminate()
+        self._pool.join()
+
+    def encrypt_messages(self, jobs, chunksize=64):
+        """
+        Encrypts many jobs across the workers.
+
+        Arguments:
+            jobs (iterable): Jobs to encrypt.
+            chunksize (int): Number of jobs sent to a worker at once.
+
+        Returns:
+            results (lst): (encrypted_message, rotor_positions) for each job,
+                           in order.
+        """
+        return self._pool.map(_encrypt_in_worker, jobs, chunksize)
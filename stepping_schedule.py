@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Analytic stepping schedule of an Enigma rotor assembly.
+
+EnigmaMachine.turn_rotor_assembly describes stepping one key press at a
+time. This module works out the whole schedule directly from the rotor
+notches and starting positions, for any number of rotors, so questions such
+as "where are the rotors after a million key presses", "when does the middle
+rotor next turn over", "how many double steps happen in this message" and
+"what is the period of this machine" take time proportional to the number of
+rotors rather than the number of key presses.
+
+The schedule is built from the key presses at which each rotor is at its
+notch (and so turns the rotor to its left, and itself too if it isn't the
+right-most rotor). The right-most rotor is at its notch every 26 key
+presses. Each other rotor is turned once every time the rotor to its right
+is at its notch, and once more straight after reaching its own notch, so
+after a short start-up it reaches its notch every 25 times the rotor to its
+right does. Every rotor's notch presses are therefore a handful of early
+presses followed by an arithmetic progression, which can be counted and
+searched in constant time.
+
+Key presses are numbered from 1, and "after k key presses" means once the
+rotors have turned for press k.
+
+Example:
+    schedule = SteppingSchedule.from_machine(EnigmaMachine())
+    schedule.positions_at(1000000)
+    schedule.count_double_steps(1, 501)
+"""
+
+from enigma_machine import EnigmaMachine
+
+
+class NotchPresses:
+    """
+    A class to represent the key presses at which a rotor is at its notch:
+    a few early presses plus an arithmetic progression.
+
+    Attributes:
+        early: (tuple)
+            Presses before the progression starts, in order.
+        first: (int)
+            First press of the progression, or None if there isn't one.
+        period: (int)
+            Presses between consecutive presses of the progression.
+    """
+    def __init__(self, early=(), first=None, period=26):
+        self.early = tuple(early)
+        self.first = first
+        self.period = period
+
+    def __repr__(self):
+        return (f'NotchPresses(early={self.early}, first={self.first}, '
+                f'period={self.period})')
+
+    def count(self, press):
+        """
+        The number of notch presses from press 1 up to and including press.
+        """
+        count = sum(1 for early in self.early if early <= press)
+        if self.first is not None and press >= self.first:
+            count += (press - self.first) // self.period + 1
+
+        return count
+
+    def between(self, start, stop):
+        """
+        The notch presses from start up to but not including stop, in order.
+        """
+        presses = [early for early in self.early if start <= early < stop]
+        if self.first is not None:
+            press = max(self.first, start)
+            # Round up to the next press of the progression.
+            press += -(press - self.first) % self.period
+            presses.extend(range(press, stop, self.period))
+
+        return presses
+
+    def next_after(self, press):
+        """
+        The first notch press after press, or None if there are no more.
+        """
+        for early in self.early:
+            if early > press:
+                return early
+        if self.first is None:
+            return None
+        if press < self.first:
+            return self.first
+
+        return press + self.period - (press - self.first) % self.period
+
+    def iterate(self):
+        """
+        Yields every notch press in order, with whether it is part of the
+        progression.
+        """
+        for early in self.early:
+            yield early, False
+        if self.first is not None:
+            press = self.first
+            while True:
+                yield press, True
+                press += self.period
+
+
+def _notch_presses(driver, notch, position):
+    """
+    Works out when a rotor that double steps is at its notch, given when the
+    rotor to its right is at its notch.
+
+    The rotor turns once on each of the driver's notch presses, and once on
+    the press after it reaches its own notch. Once it reaches its notch on
+    one of the driver's progression presses, it does so again every 25 of
+    them, so only the start needs simulating.
+
+    Arguments:
+        driver (NotchPresses): Notch presses of the rotor to the right.
+        notch (int): Notch position number of this rotor, or None.
+        position (int): Starting position number of this rotor.
+
+    Returns:
+        notch_presses (NotchPresses): Notch presses of this rotor.
+    """
+    if notch is None:
+        return NotchPresses(period=25 * driver.period)
+    early = []
+    # Press on which this rotor is next due to turn itself.
+    pending = 1 if position == notch else None
+    for press, regular in driver.iterate():
+        if pending is not None and pending < press:
+            early.append(pending)
+            position = (position + 1) % 26
+            pending = None
+        if pending == press:
+            # Turned by the driver and by itself at once.
+            early.append(pending)
+            position = (position + 2) % 26
+            pending = None
+        else:
+            position = (position + 1) % 26
+        if position == notch:
+            pending = press + 1
+            if regular:
+                return NotchPresses(early, pending, 25 * driver.period)
+    if pending is not None:
+        early.append(pending)
+
+    return NotchPresses(early, period=25 * driver.period)
+
+
+class SteppingSchedule:
+    """
+    A class to represent the stepping schedule of a rotor assembly.
+
+    Attributes:
+        notches: (lst)
+            Notch position numbers of the rotors, left-most first. None for a
+            rotor with no notch.
+        positions: (lst)
+            Starting position numbers of the rotors.
+        notch_presses: (lst)
+            NotchPresses for each rotor. The left-most rotor's notch never
+            matters so its entry is None.
+        period: (int)
+            Number of key presses after which the rotor positions repeat,
+            once the start-up is over: 26 * 25 ** (n - 2) * 26 for n >= 2
+            rotors. If a rotor has no notch the positions also repeat
+            sooner.
+        cycle_start: (int)
+            Number of key presses after which the positions are repeating,
+            so positions_at(k + period) == positions_at(k) for any k of at
+            least cycle_start.
+    """
+    def __init__(self, notches, positions):
+        """
+        Initialises a SteppingSchedule.
+        Args:
+            notches (lst): Notch position numbers of the rotors.
+            positions (lst): Starting position numbers of the rotors.
+
+        Raises:
+            ValueError if there are no rotors, or notches and positions
+            don't match up.
+        """
+        if not positions or len(notches) != len(positions):
+            raise ValueError('Need a notch and position for each rotor')
+        self.notches = list(notches)
+        self.positions = [position % 26 for position in positions]
+        last = len(positions) - 1
+        self.notch_presses = [None] * len(positions)
+        if last > 0:
+            right_first = None
+            if self.notches[last] is not None:
+                right_first = (self.notches[last] - self.positions[last]) \
+                    % 26 + 1
+            self.notch_presses[last] = NotchPresses((), right_first, 26)
+        for i in reversed(range(1, last)):
+            self.notch_presses[i] = _notch_presses(self.notch_presses[i + 1],
+                                                   self.notches[i],
+                                                   self.positions[i])
+        self.period = 26 if last == 0 else 26 * self.notch_presses[1].period
+        self.cycle_start = self._cycle_start()
+
+    @classmethod
+    def from_machine(cls, machine):
+        """
+        The schedule of an EnigmaMachine from its current rotor positions.
+        """
+        notches = [None if rotor.notch is None
+                   else EnigmaMachine.letter_to_number(rotor.notch)
+                   for rotor in machine.rotors]
+        positions = [EnigmaMachine.letter_to_number(rotor.position)
+                     for rotor in machine.rotors]
+        return cls(notches, positions)
+
+    def _cycle_start(self):
+        """
+        Finds cycle_start. Positions are repeating once every rotor's notch
+        presses are in their progressions, and once they repeat they always
+        do, so the first repeating press is found by bisection below that.
+        """
+        upper = 0
+        for notch_presses in self.notch_presses[1:]:
+            upper = max([upper, *notch_presses.early])
+            if notch_presses.first is not None:
+                upper = max(upper, notch_presses.first)
+        low, high = 0, upper
+        while low < high:
+            middle = (low + high) // 2
+            if self.positions_at(middle) == \
+               self.positions_at(middle + self.period):
+                high = middle
+            else:
+                low = middle + 1
+
+        return low
+
+    def steps(self, presses):
+        """
+        How many places each rotor has turned after a number of key presses.
+
+        Arguments:
+            presses (int): Number of key presses.
+
+        Returns:
+            steps (lst): Places turned by each rotor, left-most first.
+        """
+        last = len(self.positions) - 1
+        steps = []
+        for i in range(last + 1):
+            if i == last:
+                steps.append(presses)
+            elif i == 0:
+                steps.append(self.notch_presses[1].count(presses))
+            else:
+                steps.append(self.notch_presses[i + 1].count(presses)
+                             + self.notch_presses[i].count(presses))
+
+        return steps
+
+    def positions_at(self, presses):
+        """
+        The rotor position numbers after a number of key presses.
+        """
+        return [(position + steps) % 26 for position, steps
+                in zip(self.positions, self.steps(presses))]
+
+    def turnovers(self, rotor, start, stop):
+        """
+        The key presses from start up to but not including stop at which a
+        rotor is at its notch, turning the rotor to its left.
+
+        Arguments:
+            rotor (int): Index of the rotor, 1 or more.
+            start (int): First key press.
+            stop (int): Key press to stop before.
+        """
+        return self.notch_presses[rotor].between(start, stop)
+
+    def next_turnover(self, rotor, after=0):
+        """
+        The first key press after the given one at which a rotor is at its
+        notch, or None if it never is.
+        """
+        return self.notch_presses[rotor].next_after(after)
+
+    def calendar(self, start, stop):
+        """
+        Every turnover from start up to but not including stop.
+
+        Returns:
+            turnovers (lst): (press, rotor) tuples in order of press then
+                             rotor, where rotor is at its notch at press.
+        """
+        return sorted((press, rotor)
+                      for rotor in range(1, len(self.positions))
+                      for press in self.turnovers(rotor, start, stop))
+
+    def double_steps(self, start, stop):
+        """
+        The double steps from start up to but not including stop: presses at
+        which a rotor other than the right-most one is at its notch, so turns
+        itself along with the rotor to its left.
+
+        Returns:
+            double_steps (lst): (press, rotor) tuples in order.
+        """
+        last = len(self.positions) - 1
+        return [(press, rotor) for press, rotor in self.calendar(start, stop)
+                if rotor < last]
+
+    def count_double_steps(self, start, stop):
+        """
+        The number of double steps from start up to but not including stop.
+        """
+        return sum(self.notch_presses[rotor].count(stop - 1)
+                   - self.notch_presses[rotor].count(start - 1)
+                   for rotor in range(1, len(self.positions) - 1))
@@ -0,0 +1,125 @@
+"""
+Unit tests for the compiled_machine module.
+
+Example:
+    $ python test_compiled_machine.py
+"""
+
+import random
+import string
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from compiled_machine import CompiledMachine
+from enigma_machine import EnigmaMachine
+
+
+class CompiledMachineTestCase(unittest.TestCase):
+    """
+    Test case for compiled machines and their cursors.
+    Methods tested:
+        CompiledMachine.__init__
+        CompiledMachine.shared
+        CompiledMachine.encrypt
+        Cursor.encrypt_message
+        Cursor.rotor_positions
+    """
+    def setUp(self):
+        """
+        Construct a machine matching the EnigmaMachine unit tests.
+        """
+        self.machine = CompiledMachine(['I', 'II', 'III'], 'ABC', 'B',
+                                       'AM FI NV PS TU WZ')
+
+    def test_cursor(self):
+        """
+        A cursor encrypts like an EnigmaMachine, keeping its rotor positions
+        between messages, and cursors don't affect each other.
+        """
+        cursor = self.machine.cursor('DEF')
+        other = self.machine.cursor('DEF')
+        self.assertEqual(cursor.encrypt_message('HEL'), 'SRT')
+        self.assertEqual(cursor.encrypt_message('LO!'), 'MD!')
+        self.assertEqual(cursor.rotor_positions, 'EFK')
+        self.assertEqual(other.encrypt_message('HELLO'), 'SRTMD')
+        cursor.rotor_positions = 'DEF'
+        self.assertEqual(cursor.encrypt_message('HELLO'), 'SRTMD')
+        self.assertEqual(self.machine.encrypt('HELLO', 'DEF'),
+                         ('SRTMD', 'EFK'))
+
+        machine = CompiledMachine(['IV', 'V', 'I', 'II'], 'QRST', 'C')
+        enigma = EnigmaMachine(['IV', 'V', 'I', 'II'], 'AZQD', 'QRST', 'C',
+                               '')
+        message = 'THE QUICK BROWN FOX JUMPS OVER THE LAZY DOG' * 30
+        self.assertEqual(machine.encrypt(message, 'AZQD'),
+                         (enigma.encrypt_message(message),
+                          ''.join(rotor.position for rotor in enigma.rotors)))
+
+        with self.assertRaises(ValueError) as context:
+            self.machine.cursor('DE')
+        self.assertTrue(context.exception)
+        with self.assertRaises(ValueError) as context:
+            CompiledMachine(['Beta', 'I', 'II', 'III'], 'AAAA', 'B-thin')
+        self.assertTrue(context.exception)
+
+    def test_shared(self):
+        """
+        Machines with the same configuration are shared, and machines with
+        the same left-hand rotors and reflector share their stack table.
+        """
+        machine = CompiledMachine.shared(['I', 'II', 'III'], 'abc', 'b',
+                                         'AM FI NV PS TU WZ')
+        self.assertIs(machine, CompiledMachine.shared(
+            ('I', 'II', 'III'), 'ABC', 'B', 'AM FI NV PS TU WZ'))
+        other = CompiledMachine.shared(['I', 'II', 'IV'], 'XYZ', 'B')
+        self.assertIsNot(machine, other)
+        self.assertIs(machine._stack, other._stack)
+        enigma = EnigmaMachine(['I', 'II', 'IV'], 'DEF', 'XYZ', 'B', '')
+        self.assertEqual(other.encrypt('HELLO', 'DEF'),
+                         (enigma.encrypt_message('HELLO'),
+                          ''.join(rotor.position for rotor in enigma.rotors)))
+        with self.assertRaises(ValueError) as context:
+            CompiledMachine.shared(['I', 'II', 'III'], 'AB')
+        self.assertTrue(context.exception)
+
+    def test_immutable(self):
+        """
+        The machine definition can't be changed once built.
+        """
+        with self.assertRaises(AttributeError):
+            self.machine.ring_settings = 'AAA'
+        with self.assertRaises(AttributeError):
+            self.machine.extra = 1
+        with self.assertRaises(AttributeError):
+            del self.machine.notches
+        self.assertIsInstance(self.machine.notches, tuple)
+        self.assertIsInstance(self.machine._decryptor.notches, tuple)
+
+    def test_threads(self):
+        """
+        Many threads sharing one machine, each with its own cursors, get the
+        same results as encrypting one message at a time.
+        """
+        rng = random.Random(0)
+        jobs = [(''.join(rng.choice(string.ascii_uppercase + ' ')
+                         for _ in range(rng.randint(1, 400))),
+                 ''.join(rng.choice(string.ascii_uppercase)
+                         for _ in range(3)))
+                for _ in range(400)]
+        expected = [self.machine.encrypt(message, rotor_positions)
+                    for message, rotor_positions in jobs]
+
+        def encrypt(job):
+            message, rotor_positions = job
+            cursor = self.machine.cursor(rotor_positions)
+            # Split the message so cursors are used for many calls.
+            encrypted = ''.join(cursor.encrypt_message(message[i:i + 7])
+                                for i in range(0, len(message), 7))
+            return encrypted, cursor.rotor_positions
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(list(executor.map(encrypt, jobs)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Unit tests for the differential module.
+
+Example:
+    $ python test_differential.py
+"""
+
+import random
+import unittest
+
+import differential
+from differential import Case
+
+
+class DifferentialTestCase(unittest.TestCase):
+    """
+    Test case for the differential testing harness.
+    Methods tested:
+        reference_encrypt
+        random_case
+        fold_greek_rotor
+        find_mismatches
+        shrink
+        fuzz
+    """
+    def setUp(self):
+        """
+        Construct a case matching the EnigmaMachine unit tests.
+        """
+        self.case = Case(rotor_types=('I', 'II', 'III'),
+                         rotor_positions='DEF',
+                         ring_settings='ABC',
+                         reflector_mapping='B',
+                         steckered_pairing='AM FI NV PS TU WZ',
+                         message='HELLO, world')
+
+    def test_reference_encrypt(self):
+        """
+        Checks the reference implementation against a known encryption.
+        Punctuation is passed through without turning the rotors, and the
+        middle rotor starts on its notch so double steps on the first key.
+        """
+        output, positions = differential.reference_encrypt(self.case)
+        self.assertEqual(output[:7], 'SRTMD, ')
+        self.assertEqual(positions, 'EFP')
+
+    def test_reference_encrypt_greek_rotor(self):
+        """
+        The reference passes the current through the Greek rotor and the
+        thin reflector separately. Beta at A with B-thin, and Gamma at A
+        with C-thin, act as reflectors B and C.
+        """
+        naval_reflectors = [('Beta', 'B-thin', 'B'), ('Gamma', 'C-thin', 'C')]
+        for greek_rotor_type, thin, reflector in naval_reflectors:
+            case = self.case._replace(reflector_mapping=reflector)
+            naval = case._replace(
+                rotor_types=(greek_rotor_type,) + case.rotor_types,
+                rotor_positions='A' + case.rotor_positions,
+                ring_settings='A' + case.ring_settings,
+                reflector_mapping=thin)
+            output, positions = differential.reference_encrypt(naval)
+            self.assertEqual((output, positions[1:]),
+                             differential.reference_encrypt(case))
+            self.assertEqual(positions[0], 'A')
+            folded, greek_position = differential.fold_greek_rotor(naval)
+            self.assertEqual(greek_position, 'A')
+            self.assertEqual(differential.reference_encrypt(folded),
+                             differential.reference_encrypt(case))
+
+    def test_random_case(self):
+        """
+        Checks generated cases are valid and reproducible from their seed.
+        """
+        for i in range(200):
+            case = differential.random_case(random.Random(i), max_rotors=5,
+                                            max_length=30)
+            self.assertEqual(case, differential.random_case(
+                random.Random(i), max_rotors=5, max_length=30))
+            self.assertTrue(1 <= len(case.rotor_types) <= 5)
+            self.assertTrue(len(case.message) <= 30)
+            differential.build_machine(case)
+        naval = [case for case in (differential.random_case(random.Random(i))
+                                   for i in range(200))
+                 if case.rotor_types[0] in ('Beta', 'Gamma')]
+        self.assertTrue(naval)
+        for case in naval:
+            self.assertIn(case.reflector_mapping, ['B-thin', 'C-thin'])
+
+    def test_engines_agree(self):
+        """
+        Every registered engine should agree with the reference.
+        """
+        self.assertEqual(differential.fuzz(2000, seed=1), [])
+
+    def test_fuzz_in_workers_after_fuzz(self):
+        """
+        Worker processes forked after a fuzz run in this process must not
+        use or close the tables and pool this process made.
+        """
+        self.assertEqual(differential.fuzz(50, seed=1), [])
+        self.assertEqual(differential.fuzz(50, seed=2, jobs=2), [])
+        self.assertEqual(differential.fuzz(50, seed=3), [])
+
+    def test_shrink(self):
+        """
+        A broken engine is caught and shrunk to a minimal reproducer.
+        Here the engine goes wrong whenever the middle of three rotors is
+        type 'II' and a letter 'Q' is encrypted.
+        """
+        def broken_engine(cases):
+            results = differential.ENGINES['encrypt_message'](cases)
+            for i, case in enumerate(cases):
+                if len(case.rotor_types) == 3 and \
+                   case.rotor_types[1] == 'II' and 'Q' in case.message:
+                    results[i] = ('', results[i][1])
+            return results
+
+        case = self.case._replace(message='A QUICK MESSAGE')
+        mismatches = differential.find_mismatches(
+            [case], {'broken': broken_engine})
+        self.assertEqual(len(mismatches), 1)
+
+        shrunk = differential.shrink(case, broken_engine)
+        self.assertEqual(shrunk, Case(rotor_types=('I', 'II', 'I'),
+                                      rotor_positions='AAA',
+                                      ring_settings='AAA',
+                                      reflector_mapping='B',
+                                      steckered_pairing='',
+                                      message='Q'))
+
+    def test_engine_exceptions(self):
+        """
+        An engine raising an exception, of any type, on a case is reported
+        as disagreeing and shrunk like any other failure.
+        """
+        for error in [IndexError, ValueError]:
+            def raising_engine(cases):
+                if any('Q' in case.message for case in cases):
+                    raise error('broken')
+                return differential.ENGINES['encrypt_message'](cases)
+
+            case = self.case._replace(message='A QUICK MESSAGE')
+            mismatches = differential.find_mismatches(
+                [case], {'raising': raising_engine})
+            self.assertEqual(mismatches[0][3], ('raised', "%s('broken')"
+                                                % error.__name__))
+            shrunk = differential.shrink(case, raising_engine)
+            self.assertEqual(shrunk.message, 'Q')
+            self.assertEqual(shrunk.rotor_types, ('I',))
+
+        self.assertEqual(differential.fuzz(0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
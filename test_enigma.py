@@ -17,6 +17,8 @@ class RotorTestCase(unittest.TestCase):
         __init__
         turn_rotor
         apply_ring_setting
+        wiring
+        compose_reflection
         map_letter
     """
     def setUp(self):
@@ -71,6 +73,40 @@ class RotorTestCase(unittest.TestCase):
         expected_rotor_mapping = 'UFMHNPIOJGTYCQWRZBKAXVSDLE'
         self.assertEqual(self.rotor.mapping, expected_rotor_mapping)
 
+    def test_wiring(self):
+        """
+        Tests the wiring method for an Enigma Rotor.
+        Checks the numeric wiring matches the mapping, including after the
+        mapping has been changed by a ring setting.
+        """
+        forward, reverse = self.rotor.wiring()
+        self.assertEqual(forward[0], 4)  # A -> E
+        for number in range(26):
+            self.assertEqual(reverse[forward[number]], number)
+
+        self.rotor.apply_ring_setting('D')
+        forward, _ = self.rotor.wiring()
+        self.assertEqual(forward[0], 20)  # A -> U
+
+    def test_compose_reflection(self):
+        """
+        Tests the compose_reflection method for an Enigma Rotor.
+        Composing a reflection with the rotor should match passing a letter
+        forwards through the rotor, through the reflection and back again.
+        """
+        rotor = EnigmaMachine.Rotor(rotor_type='II',
+                                    position='K',
+                                    ring_setting='F')
+        reflector = EnigmaMachine.Reflector(reflector_mapping='B')
+        composed = rotor.compose_reflection(reflector.wiring())
+        for number in range(26):
+            letter = EnigmaMachine.number_to_letter(number)
+            letter = rotor.map_letter(letter)
+            letter = reflector.map_letter(letter)
+            letter = rotor.map_letter(letter, reverse=True)
+            self.assertEqual(EnigmaMachine.number_to_letter(composed[number]),
+                             letter)
+
     def test_map_letter(self):
         """
         Tests the map_letter method for an Enigma Rotor.
@@ -133,6 +169,31 @@ class ReflectorTestCase(unittest.TestCase):
             actual_output = self.reflector.map_letter(letter_inputs[i])
             self.assertTrue(actual_output, expected_outputs[i])
 
+    def test_greek_rotor(self):
+        """
+        Checks folding a Greek rotor into a thin reflector. With the Greek
+        rotor at "A" the thin reflectors match the standard B and C, and
+        only the difference between its position and ring setting matters.
+        """
+        beta = EnigmaMachine.Rotor(rotor_type='Beta')
+        gamma = EnigmaMachine.Rotor(rotor_type='Gamma')
+        self.assertIsNone(beta.notch)
+        self.assertEqual(
+            EnigmaMachine.Reflector('B-thin', beta).reflector_mapping,
+            EnigmaMachine.Reflector('B').reflector_mapping)
+        self.assertEqual(
+            EnigmaMachine.Reflector('C-thin', gamma).reflector_mapping,
+            EnigmaMachine.Reflector('C').reflector_mapping)
+        self.assertEqual(
+            EnigmaMachine.Reflector('B-thin', EnigmaMachine.Rotor(
+                'Beta', 'D', 'B')).reflector_mapping,
+            EnigmaMachine.Reflector('B-thin', EnigmaMachine.Rotor(
+                'Beta', 'C', 'A')).reflector_mapping)
+        self.assertNotEqual(
+            EnigmaMachine.Reflector('B-thin', EnigmaMachine.Rotor(
+                'Beta', 'C')).reflector_mapping,
+            EnigmaMachine.Reflector('B').reflector_mapping)
+
 
 class PlugboardTestCase(unittest.TestCase):
     """
@@ -185,8 +246,10 @@ class EnigmaMachineTestCase(unittest.TestCase):
         number_to_letter
         caeser_shift
         turn_rotor_assembly
+        step_positions
         press_key
         encrypt_message
+        __init__ (four rotor naval machine)
 
     Notes:
     __init__ not tested as it only calls previous __init__methods already
@@ -277,6 +340,21 @@ class EnigmaMachineTestCase(unittest.TestCase):
             actual_positions.append(rotor.position)
         self.assertEqual(expected_positions, actual_positions)
 
+    def test_step_positions(self):
+        """
+        Checks step_positions turns rotor numbers the same way
+        turn_rotor_assembly turns the rotors, including double steps.
+        """
+        positions = [3, 4, 5]
+        notches = [EnigmaMachine.letter_to_number(rotor.notch)
+                   for rotor in self.EnigmaMachine.rotors]
+        for _ in range(700):
+            self.EnigmaMachine.turn_rotor_assembly()
+            EnigmaMachine.step_positions(positions, notches)
+            self.assertEqual(positions,
+                             [EnigmaMachine.letter_to_number(rotor.position)
+                              for rotor in self.EnigmaMachine.rotors])
+
     def test_press_key(self):
         """
         Checks press_key inputs and outputs.
@@ -297,6 +375,84 @@ class EnigmaMachineTestCase(unittest.TestCase):
         actual_message = self.EnigmaMachine.encrypt_message('HELLO')
         self.assertEqual(expected_message, actual_message)
 
+    def test_many_rotors(self):
+        """
+        Checks a machine with many rotors encrypts as if the current passed
+        through every rotor in turn, including when rotors are moved by hand
+        between key presses.
+        """
+        rotor_types = ['I', 'II', 'III', 'IV', 'V'] * 4
+        machine = EnigmaMachine(rotor_types=rotor_types,
+                                rotor_positions='QEVJZABCDEFGHIJKLMNO',
+                                ring_settings='ABCDEFGHIJKLMNOPQRST',
+                                reflector_mapping='C',
+                                steckered_pairing='AM FI NV PS TU WZ')
+        for i in range(100):
+            if i == 50:
+                machine.rotors[3].position = 'X'
+            elif i == 70:
+                machine.rotors[12].turn_rotor()
+            elif i == 90:
+                machine.rotors[7].apply_ring_setting('C')
+            letter = EnigmaMachine.number_to_letter(i % 26)
+            actual_letter = machine.press_key(letter)
+
+            # Rotors have now turned so repeat the letter's journey by hand.
+            expected_letter = machine.plugboard.map_letter(letter)
+            for rotor in reversed(machine.rotors):
+                expected_letter = rotor.map_letter(expected_letter)
+            expected_letter = machine.reflector.map_letter(expected_letter)
+            for rotor in machine.rotors:
+                expected_letter = rotor.map_letter(expected_letter,
+                                                   reverse=True)
+            expected_letter = machine.plugboard.map_letter(expected_letter)
+            self.assertEqual(expected_letter, actual_letter)
+
+    def test_four_rotors(self):
+        """
+        Decrypts a message sent by U-534 in 1945 on a four rotor naval
+        machine. The Greek rotor never turns.
+        """
+        machine = EnigmaMachine(rotor_types=['Beta', 'II', 'IV', 'I'],
+                                rotor_positions='VJNA',
+                                ring_settings='AAAV',
+                                reflector_mapping='B-thin',
+                                steckered_pairing='AT BL DF GJ HM NW OP QY '
+                                                  'RZ VX')
+        self.assertEqual(len(machine.rotors), 3)
+        self.assertEqual(machine.encrypt_message(
+            'NCZW VUSX PNYM INHZ XMQX SFWX WLKJ AHSH NMCO CCAK UQPM KCSM '
+            'HKSE INJU SBLK IOSX CKUB HMLL XCSJ USRR DVKO HULX WCCB GVLI'),
+            'VONV ONJL OOKS JHFF TTTE INSE INSD REIZ WOYY QNNS NEUN INHA '
+            'LTXX BEIA NGRI FFUN TERW ASSE RGED RUEC KTYW ABOS XLET ZTER')
+        self.assertEqual(machine.greek_rotor.position, 'V')
+
+        # Beta at "A" with a thin reflector acts as a three rotor machine.
+        machine = EnigmaMachine(rotor_types=['Beta', 'I', 'II', 'III'],
+                                rotor_positions='ADEF',
+                                ring_settings='AABC',
+                                reflector_mapping='B-thin')
+        self.assertEqual(machine.encrypt_message('HELLO'), 'SRTMD')
+
+        with self.assertRaises(ValueError) as context:
+            EnigmaMachine(rotor_types=['I', 'Beta', 'II', 'III'],
+                          rotor_positions='AAAA', ring_settings='AAAA',
+                          reflector_mapping='B-thin')
+        self.assertTrue(context.exception)
+        # Greek rotors and thin reflectors only go together, and a Greek
+        # rotor on its own is not a machine.
+        for rotor_types, reflector_mapping in [
+                (['Beta', 'I', 'II', 'III'], 'B'),
+                (['I', 'II', 'III'], 'c-thin'),
+                (['Beta'], 'B-thin'),
+                ([], 'B')]:
+            with self.assertRaises(ValueError) as context:
+                EnigmaMachine(rotor_types=rotor_types,
+                              rotor_positions='A' * len(rotor_types),
+                              ring_settings='A' * len(rotor_types),
+                              reflector_mapping=reflector_mapping)
+            self.assertTrue(context.exception)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,255 @@
+"""
+Unit tests for the key_search module.
+
+Example:
+    $ python test_key_search.py
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from itertools import product
+
+import key_search
+from enigma_machine import EnigmaMachine
+
+PLAINTEXT = (
+    'THE CODEBREAKERS AT BLETCHLEY PARK WORKED IN WOODEN HUTS ON THE '
+    'GROUNDS OF A COUNTRY HOUSE. EVERY MORNING THE SETTINGS OF THE ENEMY '
+    'MACHINES CHANGED AND THE WORK OF FINDING THEM BEGAN AGAIN. THEY LOOKED '
+    'FOR CRIBS, SHORT PIECES OF PLAINTEXT THAT WERE LIKELY TO APPEAR IN A '
+    'MESSAGE, SUCH AS WEATHER REPORTS SENT AT THE SAME TIME EACH DAY. WITH '
+    'A GOOD CRIB THE BOMBES COULD TEST THOUSANDS OF SETTINGS AN HOUR, AND '
+    'BY THE END OF THE WAR MANY MESSAGES WERE READ WITHIN HOURS OF BEING '
+    'SENT. THE WORK REMAINED SECRET FOR MANY YEARS AFTER THE WAR ENDED.')
+
+
+class KeySearchTestCase(unittest.TestCase):
+    """
+    Test case for the key_search module.
+    Methods tested:
+        index_of_coincidence
+        letter_frequency
+        TrialDecryptor.decrypt_message
+        folded_reflectors
+        stepping_classes
+        canonical_configurations
+        recover_ring_settings
+        KeySearch.run_unit
+        KeySearch.run_unit (early abort)
+        KeySearch.run
+    """
+    def test_index_of_coincidence(self):
+        """
+        English scores well above random text.
+        """
+        rng = random.Random(0)
+        random_text = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                              for _ in range(len(PLAINTEXT)))
+        self.assertGreater(key_search.index_of_coincidence(PLAINTEXT), 0.06)
+        self.assertLess(key_search.index_of_coincidence(random_text), 0.045)
+        self.assertEqual(key_search.index_of_coincidence('A'), 0.0)
+        self.assertGreater(key_search.letter_frequency(PLAINTEXT),
+                           key_search.letter_frequency(random_text) + 0.3)
+
+    def test_decrypt_message(self):
+        """
+        Checks the TrialDecryptor matches an EnigmaMachine, including the
+        final rotor positions.
+        """
+        machine = EnigmaMachine(rotor_types=['I', 'II', 'III'],
+                                rotor_positions='DEF',
+                                ring_settings='ABC',
+                                reflector_mapping='B',
+                                steckered_pairing='AM FI NV PS TU WZ')
+        decryptor = key_search.TrialDecryptor(['I', 'II', 'III'], 'B',
+                                              'AM FI NV PS TU WZ')
+        expected = machine.encrypt_message(PLAINTEXT)
+        self.assertEqual(decryptor.decrypt_message(PLAINTEXT, 'DEF', 'ABC'),
+                         (expected, ''.join(rotor.position
+                                            for rotor in machine.rotors)))
+
+        with self.assertRaises(ValueError) as context:
+            decryptor.decrypt_message('HELLO', 'DE', 'ABC')
+        self.assertTrue(context.exception)
+
+    def test_folded_reflectors(self):
+        """
+        A TrialDecryptor with a folded reflector decrypts four rotor naval
+        traffic.
+        """
+        reflectors = key_search.folded_reflectors()
+        self.assertEqual(len(reflectors), 104)
+        machine = EnigmaMachine(rotor_types=['Gamma', 'IV', 'I', 'V'],
+                                rotor_positions='KDEF',
+                                ring_settings='CABC',
+                                reflector_mapping='C-thin',
+                                steckered_pairing='AM FI NV PS TU WZ')
+        ciphertext = machine.encrypt_message(PLAINTEXT)
+        for mapping, setting in reflectors.items():
+            if setting == ('Gamma', 'I', 'C-thin'):
+                decryptor = key_search.TrialDecryptor(['IV', 'I', 'V'],
+                                                      mapping,
+                                                      'AM FI NV PS TU WZ')
+        self.assertEqual(decryptor.decrypt_message(ciphertext, 'DEF',
+                                                   'ABC')[0], PLAINTEXT)
+
+        with self.assertRaises(ValueError) as context:
+            key_search.TrialDecryptor(['Beta', 'I', 'II', 'III'], 'B-thin')
+        self.assertTrue(context.exception)
+
+    def test_stepping_classes(self):
+        """
+        A one letter message can only turn the middle rotor if the right
+        rotor is at its notch, and can only double step if the middle rotor
+        is at its notch, giving four patterns.
+        """
+        classes = key_search.stepping_classes(['I', 'II', 'III'], 1)
+        self.assertEqual(len(classes), 4)
+
+    def test_canonical_configurations(self):
+        """
+        Every configuration should give the same decrypt as one of the
+        canonical configurations, and the canonical configurations should
+        (apart from patterns only differing near the end of the message,
+        which can give the same letters by coincidence) give different
+        decrypts.
+        """
+        rotor_types = ['IV', 'II']
+        ciphertext = 'QWERTYUIOPASDFGHJKLZXCVBNMQWERTYUIOPASDFG'
+        decryptor = key_search.TrialDecryptor(rotor_types, 'C', 'AB CD')
+        configurations = list(key_search.canonical_configurations(
+            rotor_types, len(ciphertext)))
+        self.assertEqual(len(configurations),
+                         26 ** 2 * len(key_search.stepping_classes(
+                             rotor_types, len(ciphertext))))
+        self.assertTrue(all(rings[0] == 'A' for _, rings in configurations))
+
+        decrypts = set(decryptor.decrypt_message(ciphertext, positions,
+                                                 rings)[0]
+                       for positions, rings in configurations)
+        self.assertGreater(len(decrypts), 0.95 * len(configurations))
+        for positions in ['AA', 'ZE', 'QQ', 'HD']:
+            for rings in ['AA', 'BZ', 'MQ']:
+                self.assertIn(decryptor.decrypt_message(
+                    ciphertext, positions, rings)[0], decrypts)
+
+    def test_recover_ring_settings(self):
+        """
+        Starting from the right offsets with ring settings of 'A', the
+        turnovers are moved back into place and the message decrypts.
+        """
+        rotor_types = ['II', 'IV', 'I']
+        ciphertext = key_search.TrialDecryptor(rotor_types).decrypt_message(
+            PLAINTEXT, 'KHB', 'FRM')[0]
+        # Offsets of the machine above, as found by a search with ring
+        # settings fixed at 'A'.
+        positions, rings, _ = key_search.recover_ring_settings(
+            ciphertext, rotor_types, 'FQP', 'AAA')
+        decrypt = key_search.TrialDecryptor(rotor_types).decrypt_message(
+            ciphertext, positions, rings)[0]
+        self.assertEqual(decrypt, PLAINTEXT)
+        self.assertNotEqual(key_search.TrialDecryptor(
+            rotor_types).decrypt_message(ciphertext, 'FQP', 'AAA')[0],
+            PLAINTEXT)
+
+    def test_run_unit(self):
+        """
+        The unit containing the left-most rotor's position finds the
+        settings used to encrypt the message.
+        """
+        rotor_types = ('II', 'IV', 'I')
+        ciphertext = key_search.TrialDecryptor(rotor_types).decrypt_message(
+            PLAINTEXT, 'KHB', 'AAA')[0]
+        search = key_search.KeySearch(ciphertext, top=3)
+        unit = (rotor_types, 'B', 10)
+        self.assertIn(unit, search.work_units())
+        best = search.run_unit(unit)[0]
+        self.assertEqual(best.rotor_positions, 'KHB')
+        self.assertEqual(best.rotor_types, rotor_types)
+
+    def test_run_unit_early_abort(self):
+        """
+        Without a tolerance every trial is decrypted in full. With one,
+        trials falling well behind the best are dropped early, giving the
+        same candidates with far fewer letters decrypted once a strong bar
+        is known.
+        """
+        rotor_types = ('II', 'IV', 'I')
+        ciphertext = key_search.TrialDecryptor(rotor_types).decrypt_message(
+            PLAINTEXT, 'KHB', 'AAA')[0]
+        numbers = key_search.text_to_numbers(ciphertext)
+        decryptor = key_search.TrialDecryptor(rotor_types)
+        unit = (rotor_types, 'B', 10)
+        for score in key_search.SCORES:
+            expected = key_search.merge_candidates(
+                [key_search.Candidate(
+                    key_search.SCORES[score](decryptor.decrypt(
+                        numbers, [10, middle, right], [0, 0, 0])),
+                    rotor_types, 'B',
+                    key_search.numbers_to_text([10, middle, right]), 'AAA')
+                 for middle, right in product(range(26), repeat=2)], 3)
+            self.assertEqual(expected[0].rotor_positions, 'KHB')
+            search = key_search.KeySearch(ciphertext, top=3, score=score)
+            self.assertEqual(search.run_unit(unit), expected)
+            self.assertEqual(search.letters_decrypted, 676 * len(numbers))
+
+            search = key_search.KeySearch(ciphertext, top=3, score=score,
+                                          tolerance=3)
+            self.assertEqual(search.run_unit(unit), expected)
+            # Nothing in another unit gets near the best so far.
+            search = key_search.KeySearch(ciphertext, top=1, score=score,
+                                          tolerance=3)
+            self.assertEqual(search.run_unit((rotor_types, 'B', 11),
+                                             expected[0].score), [])
+            self.assertLess(search.letters_decrypted,
+                            0.4 * 676 * len(numbers))
+        with self.assertRaises(ValueError) as context:
+            key_search.KeySearch(ciphertext, tolerance=-1)
+        self.assertTrue(context.exception)
+
+    def test_run(self):
+        """
+        An interrupted search resumes from its checkpoint without repeating
+        completed units, and finds the same candidates as an uninterrupted
+        search.
+        """
+        rotor_types = ('V', 'I', 'III')
+        ciphertext = key_search.TrialDecryptor(rotor_types).decrypt_message(
+            PLAINTEXT[:80], 'CAT', 'AAA')[0]
+        search = key_search.KeySearch(ciphertext, rotor_orders=[rotor_types],
+                                      reflectors=['B', 'C'], top=5)
+        expected = search.run()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.json')
+            progress = []
+            search.run(checkpoint_path=path, max_units=20,
+                       progress=lambda done, total: progress.append(done))
+            self.assertEqual(progress, list(range(1, 21)))
+            completed, _ = search.load_checkpoint(path)
+            self.assertEqual(len(completed), 20)
+
+            resumed = key_search.KeySearch(**search.parameters())
+            progress = []
+            actual = resumed.run(
+                checkpoint_path=path,
+                progress=lambda done, total: progress.append(done))
+            self.assertEqual(progress, list(range(21, 53)))
+            self.assertEqual(actual, expected)
+
+            # A different search can't use the checkpoint.
+            other = key_search.KeySearch(ciphertext + 'A',
+                                         rotor_orders=[rotor_types])
+            with self.assertRaises(ValueError) as context:
+                other.run(checkpoint_path=path)
+            self.assertTrue(context.exception)
+
+        with self.assertRaises(ValueError) as context:
+            key_search.KeySearch(ciphertext, rotor_orders=[])
+        self.assertIn('at least one rotor order', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Unit tests for the random_access module.
+
+Example:
+    $ python test_random_access.py
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from enigma_machine import EnigmaMachine
+from random_access import RandomAccessReader, build_index, load_index
+
+PLAINTEXT = (
+    'Naval Enigma traffic was read at Bletchley Park from the summer of '
+    '1941, after codebooks were captured from weather ships. When the '
+    'U-boats changed to the four rotor machine in February 1942, the '
+    'messages could not be read again for most of that year.')
+
+
+class RandomAccessTestCase(unittest.TestCase):
+    """
+    Test case for random access decryption.
+    Methods tested:
+        build_index
+        load_index
+        RandomAccessReader.rotor_positions_at
+        RandomAccessReader.decrypt_range
+    """
+    def setUp(self):
+        """
+        Write a ciphertext file with mixed case, punctuation and line breaks,
+        long enough for the middle rotor to turn many times.
+        """
+        self.plaintext = '\n'.join([PLAINTEXT, PLAINTEXT.lower()] * 8)
+        machine = EnigmaMachine(rotor_types=['I', 'II', 'III'],
+                                rotor_positions='DEF',
+                                ring_settings='ABC',
+                                reflector_mapping='B',
+                                steckered_pairing='AM FI NV PS TU WZ')
+        ciphertext = machine.encrypt_message(self.plaintext)
+        self.final_positions = ''.join(rotor.position
+                                       for rotor in machine.rotors)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'archive.txt')
+        with open(self.path, 'w') as data_file:
+            data_file.write(ciphertext)
+
+    def open_reader(self):
+        """
+        Open the file with the settings it was encrypted with.
+        """
+        reader = RandomAccessReader(self.path, ['I', 'II', 'III'], 'DEF',
+                                    'ABC', 'B', 'AM FI NV PS TU WZ')
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_decrypt_range(self):
+        """
+        Any range decrypts to the same as decrypting the whole file.
+        """
+        build_index(self.path, block_size=100)
+        reader = self.open_reader()
+        expected = self.plaintext.upper()
+        self.assertEqual(reader.size, len(expected))
+        self.assertEqual(reader.rotor_positions_at(reader.size),
+                         self.final_positions)
+        self.assertEqual(reader.decrypt_range(0, reader.size), expected)
+        rng = random.Random(0)
+        for _ in range(50):
+            start = rng.randrange(reader.size)
+            stop = start + rng.randrange(300)
+            self.assertEqual(reader.decrypt_range(start, stop),
+                             expected[start:stop])
+        with self.assertRaises(IndexError):
+            reader.decrypt_range(-1, 10)
+
+    def test_index(self):
+        """
+        The index counts the letters before each block, and is rejected once
+        the file changes, even if its size stays the same.
+        """
+        build_index(self.path, block_size=1000)
+        block_size, counts = load_index(self.path)
+        self.assertEqual(block_size, 1000)
+        self.assertEqual(counts[1], sum(letter.isalpha() for letter
+                                        in self.plaintext[:1000]))
+        self.assertEqual(counts[-1], sum(letter.isalpha() for letter
+                                         in self.plaintext))
+        with open(self.path, 'r+') as data_file:
+            data_file.write('X')
+        # Make sure the modification time moves, however coarse it is.
+        status = os.stat(self.path)
+        os.utime(self.path, ns=(status.st_atime_ns,
+                                status.st_mtime_ns + 10 ** 9))
+        with self.assertRaises(ValueError) as context:
+            self.open_reader()
+        self.assertTrue(context.exception)
+        build_index(self.path, block_size=1000)
+        self.open_reader()
+        with open(self.path, 'a') as data_file:
+            data_file.write('MORE')
+        with self.assertRaises(ValueError) as context:
+            self.open_reader()
+        self.assertTrue(context.exception)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Unit tests for the search_coordinator module.
+
+Example:
+    $ python test_search_coordinator.py
+"""
+
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from multiprocessing import Process
+
+import search_coordinator
+from key_search import KeySearch, TrialDecryptor
+
+
+class CoordinatorTestCase(unittest.TestCase):
+    """
+    Test case for a distributed key search.
+    Methods tested:
+        Coordinator.run
+        run_worker
+    """
+    def setUp(self):
+        """
+        Construct a small search over one rotor order and two reflectors.
+        """
+        ciphertext = TrialDecryptor(['III', 'I', 'II']).decrypt_message(
+            'ATTACK AT DAWN FROM THE NORTH', 'PIE', 'AAA')[0]
+        self.search = KeySearch(ciphertext, rotor_orders=[('III', 'I', 'II')],
+                                reflectors=['B', 'C'], top=5)
+
+    def run_coordinator(self, coordinator):
+        """
+        Runs a coordinator on a thread, returning a dictionary its result
+        will be put in.
+        """
+        result = {}
+        thread = threading.Thread(
+            target=lambda: result.setdefault('candidates', coordinator.run()))
+        thread.start()
+        self.addCleanup(thread.join, 30)
+        return result, thread
+
+    def test_workers(self):
+        """
+        Several worker processes share the units and their merged candidates
+        match a search run in a single process.
+        """
+        coordinator = search_coordinator.Coordinator(self.search)
+        result, thread = self.run_coordinator(coordinator)
+        workers = [Process(target=search_coordinator.run_worker,
+                           args=coordinator.address) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        thread.join(60)
+        for worker in workers:
+            worker.join(10)
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(result['candidates'], self.search.run())
+
+    def test_lost_worker(self):
+        """
+        A worker that disconnects part way through a unit has its unit
+        reassigned, and completed units are checkpointed.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.json')
+            coordinator = search_coordinator.Coordinator(
+                self.search, checkpoint_path=path)
+            result, thread = self.run_coordinator(coordinator)
+
+            # Take a unit then disappear.
+            with socket.create_connection(coordinator.address) as connection, \
+                    connection.makefile('rwb') as stream:
+                search_coordinator.receive_message(stream)
+                message = search_coordinator.receive_message(stream)
+                self.assertEqual(message['type'], 'unit')
+
+            units_run = search_coordinator.run_worker(*coordinator.address)
+            thread.join(60)
+            self.assertEqual(units_run, len(self.search.work_units()))
+            self.assertEqual(result['candidates'], self.search.run())
+
+            completed, candidates = self.search.load_checkpoint(path)
+            self.assertEqual(len(completed), units_run)
+            self.assertEqual(candidates, result['candidates'])
+
+    def test_threshold(self):
+        """
+        Once enough candidates are in, units are sent with the score of the
+        worst of the best so far, and the result is unchanged.
+        """
+        self.search = KeySearch(self.search.ciphertext,
+                                rotor_orders=self.search.rotor_orders,
+                                reflectors=['B', 'C'], top=5,
+                                score='letter_frequency')
+        coordinator = search_coordinator.Coordinator(self.search)
+        result, thread = self.run_coordinator(coordinator)
+        units = self.search.work_units()
+        with socket.create_connection(coordinator.address) as connection, \
+                connection.makefile('rwb') as stream:
+            search_coordinator.receive_message(stream)
+            message = search_coordinator.receive_message(stream)
+            self.assertIsNone(message['threshold'])
+            candidates = self.search.run_unit(units[message['id']])
+            search_coordinator.send_message(stream, {
+                'type': 'result', 'id': message['id'],
+                'candidates': [list(candidate) for candidate in candidates]})
+            message = search_coordinator.receive_message(stream)
+            self.assertEqual(message['threshold'], candidates[-1].score)
+            search_coordinator.send_message(stream, {
+                'type': 'result', 'id': message['id'],
+                'candidates': [list(candidate) for candidate
+                               in self.search.run_unit(
+                                   units[message['id']],
+                                   message['threshold'])]})
+
+        search_coordinator.run_worker(*coordinator.address)
+        thread.join(60)
+        self.assertEqual(result['candidates'], self.search.run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+"""
+Unit tests for the sessions module.
+
+Example:
+    $ python test_sessions.py
+"""
+
+import tracemalloc
+import unittest
+
+from enigma_machine import EnigmaMachine
+from sessions import MachineWiring, Session, SessionStore
+
+
+class SessionsTestCase(unittest.TestCase):
+    """
+    Test case for compact sessions.
+    Methods tested:
+        MachineWiring.shared
+        Session.encrypt_message
+        SessionStore.add
+        SessionStore.remove
+        SessionStore.encrypt_message
+    """
+    def setUp(self):
+        """
+        Construct a wiring matching the EnigmaMachine unit tests.
+        """
+        self.wiring = MachineWiring.shared(['I', 'II', 'III'], 'ABC', 'B',
+                                           'AM FI NV PS TU WZ')
+
+    def test_shared(self):
+        """
+        Sessions with the same configuration share one wiring.
+        """
+        self.assertIs(self.wiring, MachineWiring.shared(
+            ('I', 'II', 'III'), 'abc', 'B', 'AM FI NV PS TU WZ'))
+        self.assertIsNot(self.wiring, MachineWiring.shared(
+            ['I', 'II', 'III'], 'ABD', 'B', 'AM FI NV PS TU WZ'))
+        self.assertIs(self.wiring, MachineWiring.shared(
+            ['I', 'II', 'III'], 'ABC', 'b', 'AM FI NV PS TU WZ'))
+        with self.assertRaises(ValueError) as context:
+            MachineWiring(['I', 'II', 'III'], 'AB')
+        self.assertTrue(context.exception)
+
+    def test_session(self):
+        """
+        A session encrypts like an EnigmaMachine, keeping its rotor
+        positions between messages.
+        """
+        session = Session(self.wiring, 'DEF')
+        self.assertEqual(session.encrypt_message('HEL'), 'SRT')
+        self.assertEqual(session.encrypt_message('LO!'), 'MD!')
+        self.assertEqual(session.rotor_positions, 'EFK')
+        with self.assertRaises(ValueError) as context:
+            Session(self.wiring, 'DE')
+        self.assertTrue(context.exception)
+
+    def test_session_store(self):
+        """
+        Sessions in a store keep separate rotor positions.
+        """
+        store = SessionStore()
+        first = store.add(self.wiring, 'DEF')
+        second = store.add(self.wiring, 'DEF')
+        self.assertEqual(store.encrypt_message(first, 'HELLO'), 'SRTMD')
+        self.assertEqual(store.rotor_positions(first), 'EFK')
+        self.assertEqual(store.rotor_positions(second), 'DEF')
+        self.assertEqual(store.encrypt_message(second, 'HELLO'), 'SRTMD')
+        self.assertIs(store.wiring(second), self.wiring)
+        with self.assertRaises(IndexError) as context:
+            store.rotor_positions(2)
+        self.assertTrue(context.exception)
+
+    def test_session_store_remove(self):
+        """
+        Removed sessions are gone, and their records are reused.
+        """
+        store = SessionStore()
+        first = store.add(self.wiring, 'DEF')
+        second = store.add(self.wiring, 'QRS')
+        store.remove(first)
+        self.assertEqual(len(store), 1)
+        for method in [store.rotor_positions, store.wiring, store.remove]:
+            with self.assertRaises(IndexError):
+                method(first)
+        self.assertEqual(store.rotor_positions(second), 'QRS')
+
+        other = MachineWiring.shared(['I', 'II', 'III'], 'AAA', 'C')
+        third = store.add(other, 'ABC')
+        self.assertEqual(third, first)
+        self.assertEqual(len(store), 2)
+        self.assertIs(store.wiring(third), other)
+        self.assertEqual(store.rotor_positions(third), 'ABC')
+        self.assertEqual(store.add(self.wiring, 'DEF'), 2)
+
+    def test_memory(self):
+        """
+        Checks the memory used per session is tens of bytes for a Session
+        and a handful of bytes in a SessionStore, compared with around a
+        kilobyte for an EnigmaMachine.
+        """
+        num_sessions = 10000
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            sessions = [Session(self.wiring, 'QRS')
+                        for _ in range(num_sessions)]
+            session_bytes = tracemalloc.get_traced_memory()[0] - start
+
+            start = tracemalloc.get_traced_memory()[0]
+            store = SessionStore()
+            for _ in range(num_sessions):
+                store.add(self.wiring, 'QRS')
+            store_bytes = tracemalloc.get_traced_memory()[0] - start
+
+            start = tracemalloc.get_traced_memory()[0]
+            machines = [EnigmaMachine() for _ in range(100)]
+            machine_bytes = tracemalloc.get_traced_memory()[0] - start
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(len(sessions), len(store))
+        self.assertLess(session_bytes / num_sessions, 100)
+        self.assertLess(store_bytes / num_sessions, 10)
+        self.assertGreater(machine_bytes / len(machines), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
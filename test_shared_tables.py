@@ -0,0 +1,129 @@
+"""
+Unit tests for the shared_tables module.
+
+Example:
+    $ python test_shared_tables.py
+"""
+
+import pickle
+import subprocess
+import sys
+import time
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+
+from enigma_machine import EnigmaMachine
+from shared_tables import Job, SharedTablePool, SharedTables, TableView
+
+
+class SharedTablesTestCase(unittest.TestCase):
+    """
+    Test case for shared memory tables.
+    Methods tested:
+        SharedTables.close
+        TableView.table
+        TableView.encrypt
+        SharedTablePool.encrypt_messages
+    """
+    def setUp(self):
+        """
+        Construct shared tables with reflection tables for one rotor order
+        and some jobs, with and without those tables.
+        """
+        self.tables = SharedTables(rotor_orders=[('I', 'II', 'III')],
+                                   reflectors=['B'])
+        self.addCleanup(self.tables.close)
+        self.jobs = [Job(('I', 'II', 'III'), 'DEF', 'ABC', 'B',
+                         'AM FI NV PS TU WZ', 'HELLO, WORLD'),
+                     Job(('V', 'II', 'IV'), 'QEJ', 'XYZ', 'C', 'AB',
+                         'Attack at dawn.'),
+                     Job(('II', 'III', 'I', 'V'), 'AAAA', 'BBBB', 'A', '',
+                         'A four rotor machine')]
+
+    def expected(self, job):
+        """
+        Encrypts a job with an EnigmaMachine.
+        """
+        machine = EnigmaMachine(list(job.rotor_types), job.rotor_positions,
+                                job.ring_settings, job.reflector_mapping,
+                                job.steckered_pairing)
+        return (machine.encrypt_message(job.message),
+                ''.join(rotor.position for rotor in machine.rotors))
+
+    def test_encrypt(self):
+        """
+        Encrypting with the tables matches an EnigmaMachine.
+        """
+        view = TableView(self.tables.handle)
+        for job in self.jobs:
+            self.assertEqual(view.encrypt(job), self.expected(job))
+        # Greek rotors never turn, so must be folded into the reflector.
+        with self.assertRaises(ValueError) as context:
+            view.encrypt(Job(('Beta', 'II', 'IV', 'I'), 'VDIQ', 'AAAA',
+                             'B-thin', '', 'HELLOWORLDHELLOWORLD'))
+        self.assertTrue(context.exception)
+
+    def test_pool(self):
+        """
+        Pool workers attach to the tables from a small handle and encrypt
+        the same as an EnigmaMachine.
+        """
+        self.assertLess(len(pickle.dumps(self.tables.handle)), 2048)
+        with SharedTablePool(self.tables, processes=2) as pool:
+            results = pool.encrypt_messages(self.jobs * 20, chunksize=3)
+        self.assertEqual(results,
+                         [self.expected(job) for job in self.jobs * 20])
+
+    def test_close(self):
+        """
+        Closing the tables removes the segment.
+        """
+        name = self.tables.handle.name
+        self.tables.close()
+        with self.assertRaises(FileNotFoundError) as context:
+            SharedMemory(name=name)
+        self.assertTrue(context.exception)
+
+    def test_close_with_views(self):
+        """
+        Closing the tables with views and tables from them still alive
+        removes the segment, and the views can't be used afterwards.
+        """
+        name = self.tables.handle.name
+        view = self.tables.view()
+        self.assertEqual(view.encrypt(self.jobs[0]), self.expected(
+            self.jobs[0]))
+        reflector = view.table('reflector B')
+        self.tables.close()
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=name)
+        with self.assertRaises(ValueError):
+            reflector[0]
+
+    def test_crash(self):
+        """
+        The segment is removed even if the process that made it is killed
+        without closing it.
+        """
+        code = ('import os\n'
+                'from shared_tables import SharedTables\n'
+                'tables = SharedTables()\n'
+                'print(tables.handle.name, flush=True)\n'
+                'os._exit(1)\n')
+        process = subprocess.run([sys.executable, '-c', code],
+                                 capture_output=True, text=True)
+        name = process.stdout.strip()
+        self.assertTrue(name)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                segment = SharedMemory(name=name)
+            except FileNotFoundError:
+                break
+            segment.close()
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
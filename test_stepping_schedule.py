@@ -0,0 +1,122 @@
+"""
+Unit tests for the stepping_schedule module.
+
+Example:
+    $ python test_stepping_schedule.py
+"""
+
+import random
+import unittest
+
+from enigma_machine import EnigmaMachine
+from stepping_schedule import SteppingSchedule
+
+
+def simulate(notches, positions, presses):
+    """
+    Rotor positions after each key press, turning one press at a time.
+    """
+    positions = list(positions)
+    history = [list(positions)]
+    for _ in range(presses):
+        history.append(list(EnigmaMachine.step_positions(positions,
+                                                         notches)))
+
+    return history
+
+
+class SteppingScheduleTestCase(unittest.TestCase):
+    """
+    Test case for the analytic stepping schedule.
+    Methods tested:
+        SteppingSchedule.from_machine
+        SteppingSchedule.positions_at
+        SteppingSchedule.calendar
+        SteppingSchedule.double_steps
+        SteppingSchedule.count_double_steps
+        SteppingSchedule.next_turnover
+    """
+    def test_machine(self):
+        """
+        The schedule of a machine matches its rotor positions, including the
+        double step of the middle rotor.
+        """
+        machine = EnigmaMachine(['I', 'II', 'III'], 'ADU', 'AAA')
+        schedule = SteppingSchedule.from_machine(machine)
+        self.assertEqual(schedule.period, 16900)
+        self.assertEqual(schedule.double_steps(1, 30), [(3, 1)])
+        self.assertEqual(schedule.next_turnover(2), 2)
+        self.assertEqual(schedule.next_turnover(1), 3)
+        self.assertEqual(schedule.next_turnover(1, after=3), 653)
+        machine.encrypt_message('X' * 1000)
+        self.assertEqual(''.join(rotor.position for rotor in machine.rotors),
+                         ''.join(EnigmaMachine.number_to_letter(position)
+                                 for position in schedule.positions_at(1000)))
+        with self.assertRaises(ValueError) as context:
+            SteppingSchedule([16, 4], [0])
+        self.assertTrue(context.exception)
+
+    def test_against_simulation(self):
+        """
+        Random rotor stacks of up to six rotors agree with turning one key
+        press at a time.
+        """
+        rng = random.Random(1)
+        for _ in range(60):
+            num_rotors = rng.randint(1, 6)
+            notches = [rng.choice([None] + list(range(26))) if
+                       rng.random() < 0.1 else rng.randrange(26)
+                       for _ in range(num_rotors)]
+            positions = [rng.randrange(26) for _ in range(num_rotors)]
+            presses = 3000
+            history = simulate(notches, positions, presses)
+            schedule = SteppingSchedule(notches, positions)
+            for k in list(range(40)) + rng.sample(range(presses + 1), 40):
+                self.assertEqual(schedule.positions_at(k), history[k])
+
+            calendar = [(k, i) for k in range(1, presses + 1)
+                        for i in range(1, num_rotors)
+                        if history[k - 1][i] == notches[i]]
+            self.assertEqual(schedule.calendar(1, presses + 1), calendar)
+            self.assertEqual(schedule.calendar(100, 2000),
+                             [(k, i) for k, i in calendar if 100 <= k < 2000])
+            double_steps = [(k, i) for k, i in calendar
+                            if i < num_rotors - 1]
+            self.assertEqual(schedule.double_steps(1, presses + 1),
+                             double_steps)
+            self.assertEqual(schedule.count_double_steps(7, 2500),
+                             len([k for k, _ in double_steps
+                                  if 7 <= k < 2500]))
+            for rotor in range(1, num_rotors):
+                presses_at_notch = [k for k, i in calendar if i == rotor]
+                if presses_at_notch:
+                    self.assertEqual(schedule.next_turnover(rotor, 0),
+                                     presses_at_notch[0])
+
+    def test_period(self):
+        """
+        Positions repeat with the schedule's period from its cycle start,
+        and not before.
+        """
+        notches = [16, 4, 21]
+        for positions in ([0, 0, 0], [0, 4, 0], [3, 5, 21], [0, 4, 22]):
+            schedule = SteppingSchedule(notches, positions)
+            history = simulate(notches, positions, 16900 + 30)
+            start = schedule.cycle_start
+            self.assertEqual(history[start], history[start + 16900])
+            self.assertEqual(history[start + 29], history[start + 16929])
+            self.assertEqual(history[start:start + 16900].count(
+                history[start]), 1)
+            if start:
+                self.assertNotEqual(history[start - 1],
+                                    history[start + 16899])
+        self.assertEqual(SteppingSchedule([16, 4, 21, 9], [0] * 4).period,
+                         26 * 25 * 25 * 26)
+        self.assertEqual(SteppingSchedule([16, 4, 21, 9], [0] * 4)
+                         .positions_at(10 ** 12 + 422500),
+                         SteppingSchedule([16, 4, 21, 9], [0] * 4)
+                         .positions_at(10 ** 12))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Unit tests for the traffic_generator module.
+
+Example:
+    $ python test_traffic_generator.py
+"""
+
+import json
+import os
+import random
+import tempfile
+import unittest
+
+import traffic_generator
+from enigma_machine import EnigmaMachine
+
+
+class TrafficGeneratorTestCase(unittest.TestCase):
+    """
+    Test case for the synthetic traffic generator.
+    Methods tested:
+        random_key_sheet
+        generate_messages
+        generate_corpus
+    """
+    def setUp(self):
+        """
+        Construct a directory to write corpora to.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_random_key_sheet(self):
+        """
+        Key sheets have three different rotors and the requested number of
+        plugboard pairs, and can be used to build a machine.
+        """
+        rng = random.Random(0)
+        for num_pairs in [0, 6, 13]:
+            key_sheet = traffic_generator.random_key_sheet(rng, 0, num_pairs)
+            self.assertEqual(len(set(key_sheet.rotor_types)), 3)
+            self.assertEqual(len(key_sheet.steckered_pairing.split()),
+                             num_pairs)
+            EnigmaMachine(list(key_sheet.rotor_types), 'AAA',
+                          key_sheet.ring_settings,
+                          key_sheet.reflector_mapping,
+                          key_sheet.steckered_pairing)
+        with self.assertRaises(ValueError) as context:
+            traffic_generator.random_key_sheet(rng, 0, 14)
+        self.assertTrue(context.exception)
+
+    def test_generate_messages(self):
+        """
+        Messages decrypt with an EnigmaMachine set up from the key sheet,
+        the ground setting and the message key.
+        """
+        key_sheet = traffic_generator.random_key_sheet(random.Random(1), 3)
+        messages = traffic_generator.generate_messages(key_sheet, 20, 'seed',
+                                                       doubled=True)
+        for message in messages:
+            machine = EnigmaMachine(list(key_sheet.rotor_types),
+                                    message['ground_setting'],
+                                    key_sheet.ring_settings,
+                                    key_sheet.reflector_mapping,
+                                    key_sheet.steckered_pairing)
+            self.assertEqual(machine.encrypt_message(message['encrypted_key']),
+                             message['message_key'] * 2)
+            machine = EnigmaMachine(list(key_sheet.rotor_types),
+                                    message['message_key'],
+                                    key_sheet.ring_settings,
+                                    key_sheet.reflector_mapping,
+                                    key_sheet.steckered_pairing)
+            self.assertEqual(machine.encrypt_message(message['ciphertext']),
+                             message['plaintext'])
+            self.assertEqual(message['day'], 3)
+
+    def test_generate_corpus(self):
+        """
+        A corpus is the same whatever the number of worker processes, and
+        has every day's messages.
+        """
+        paths = []
+        for jobs in [1, 2]:
+            path = os.path.join(self.directory, f'corpus{jobs}.jsonl')
+            key_sheet_path = os.path.join(self.directory, 'keys.jsonl')
+            key_sheets = traffic_generator.generate_corpus(
+                path, 3, 25, seed=5, jobs=jobs, chunk_size=10,
+                key_sheet_path=key_sheet_path)
+            paths.append(path)
+        with open(paths[0]) as first, open(paths[1]) as second:
+            self.assertEqual(first.read(), second.read())
+
+        with open(paths[0]) as corpus_file:
+            days = [json.loads(line)['day'] for line in corpus_file]
+        self.assertEqual(days, [0] * 25 + [1] * 25 + [2] * 25)
+        with open(key_sheet_path) as key_sheet_file:
+            self.assertEqual([json.loads(line)['ring_settings']
+                              for line in key_sheet_file],
+                             [key_sheet.ring_settings
+                              for key_sheet in key_sheets])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Unit tests for the zygalski module.
+
+Example:
+    $ python test_zygalski.py
+"""
+
+import random
+import string
+import unittest
+from itertools import permutations
+
+import zygalski
+from enigma_machine import EnigmaMachine
+
+
+class ZygalskiTestCase(unittest.TestCase):
+    """
+    Test case for the Zygalski sheet attack.
+    Methods tested:
+        roll_sheet
+        sheets_for
+        females
+        surviving_settings
+    """
+    def test_roll_sheet(self):
+        """
+        Rolling moves single bits to the right row and column, wrapping
+        around both ways.
+        """
+        for row, column, rows, columns in [(0, 0, 1, 1), (25, 25, 1, 1),
+                                           (3, 24, 30, 5), (10, 2, 0, -3)]:
+            sheet = zygalski.roll_sheet(1 << (26 * row + column), rows,
+                                        columns)
+            expected_bit = 26 * ((row + rows) % 26) + (column + columns) % 26
+            self.assertEqual(sheet, 1 << expected_bit)
+
+    def test_sheets_for(self):
+        """
+        A sheet is marked exactly where a machine with those settings has
+        encryptions which agree on some letter at the pair of places.
+        """
+        rotor_types = ['II', 'V', 'I']
+        sheets = zygalski.sheets_for(rotor_types, 'C')
+        rng = random.Random(0)
+        for _ in range(20):
+            # Ground setting chosen so only the right-most rotor turns.
+            ground_setting = rng.choice('ABCDEFGHIJKL') + \
+                rng.choice('STUVWXY') + rng.choice('ABCDEFGHIJ')
+            ring_settings = ''.join(rng.choice(string.ascii_uppercase)
+                                    for _ in range(3))
+            pair = rng.randrange(3)
+            encryptions = []
+            for place in [pair, pair + 3]:
+                encryption = ''
+                for letter in string.ascii_uppercase:
+                    machine = EnigmaMachine(rotor_types, ground_setting,
+                                            ring_settings, 'C', '')
+                    encryption = encryption + \
+                        machine.encrypt_message('A' * place + letter)[-1]
+                encryptions.append(encryption)
+            expected = any(a == b for a, b in zip(*encryptions))
+
+            left, middle, right = [EnigmaMachine.letter_to_number(letter)
+                                   for letter in ground_setting]
+            left_ring, middle_ring, right_ring = \
+                [EnigmaMachine.letter_to_number(letter)
+                 for letter in ring_settings]
+            sheet = zygalski.roll_sheet(
+                sheets[pair][(left - left_ring) % 26], middle, right)
+            actual = bool(sheet >> (26 * middle_ring + right_ring) & 1)
+            self.assertEqual(actual, expected)
+
+    def test_females(self):
+        """
+        Repeated letters three places apart are females.
+        """
+        found = zygalski.females([('ABC', 'QWEQRT'), ('XYZ', 'POIUOI'),
+                                  ('DEF', 'ABCDEF')])
+        self.assertEqual(found, [([0, 1, 2], 0), ([23, 24, 25], 1),
+                                 ([23, 24, 25], 2)])
+        with self.assertRaises(ValueError) as context:
+            zygalski.females([('ABC', 'QWEQR')])
+        self.assertTrue(context.exception)
+
+    def test_surviving_settings(self):
+        """
+        With a day's traffic only the true rotor order and ring settings
+        survive.
+        """
+        rng = random.Random(3)
+        rotor_types = ('IV', 'I', 'III')
+        indicators = []
+        for _ in range(200):
+            ground_setting = ''.join(rng.choice(string.ascii_uppercase)
+                                     for _ in range(3))
+            message_key = ''.join(rng.choice(string.ascii_uppercase)
+                                  for _ in range(3))
+            machine = EnigmaMachine(list(rotor_types), ground_setting, 'KQD',
+                                    'B', 'AB CD EF GH IJ KL')
+            indicators.append((ground_setting,
+                               machine.encrypt_message(message_key * 2)))
+
+        survivors = zygalski.surviving_settings(
+            indicators, rotor_orders=permutations(['I', 'III', 'IV'], 3))
+        self.assertEqual(survivors, {rotor_types: ['KQD']})
+
+
+if __name__ == '__main__':
+    unittest.main()
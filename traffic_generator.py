@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Synthetic Enigma traffic for load testing and benchmarking.
+
+Generates random daily key sheets and corpora of messages encrypted with
+them, following the operating procedure used from 1940: each message has a
+ground setting sent in the clear and a message key encrypted at that ground
+setting (typed twice if doubled indicators are wanted, as before May 1940),
+and the message itself is encrypted starting from the message key.
+
+Corpora are written as JSON lines, one message per line, while they are
+generated. The work is split into chunks that each have their own seed, so
+a corpus is exactly reproducible from its seed however many worker
+processes generate it.
+
+Ran as a script it writes a corpus and its key sheets.
+
+Example:
+    $ python traffic_generator.py corpus.jsonl --days 31 \\
+          --messages-per-day 100000 --seed 1 --jobs 8
+"""
+
+import argparse
+import json
+import random
+import string
+from collections import namedtuple
+from multiprocessing import Pool
+
+from key_search import text_to_numbers
+from sessions import MachineWiring
+
+ROTOR_TYPES = ['I', 'II', 'III', 'IV', 'V']
+# Vocabulary plaintext is made from.
+WORDS = ['AN', 'OBERKOMMANDO', 'DER', 'WEHRMACHT', 'FEIND', 'STELLUNG',
+         'ANGRIFF', 'BEI', 'MORGENGRAUEN', 'WETTER', 'KLAR', 'WIND', 'AUS',
+         'NORD', 'SUED', 'OST', 'WEST', 'KEINE', 'BESONDEREN', 'EREIGNISSE',
+         'VERSTAERKUNG', 'ERBETEN', 'MUNITION', 'TREIBSTOFF', 'NACHSCHUB',
+         'EINGETROFFEN', 'BEFEHL', 'AUSGEFUEHRT', 'QUADRAT', 'KURS', 'FAHRT',
+         'EINS', 'ZWEI', 'DREI', 'VIER', 'FUENF', 'SECHS', 'SIEBEN', 'ACHT',
+         'NEUN', 'NULL', 'UHR', 'FLUGZEUGE', 'GESICHTET', 'HAFEN', 'BRUECKE',
+         'DIVISION', 'REGIMENT', 'BATAILLON', 'KOMPANIE', 'MELDUNG', 'ENDE']
+
+KeySheet = namedtuple('KeySheet', ['day', 'rotor_types', 'ring_settings',
+                                   'reflector_mapping', 'steckered_pairing'])
+
+
+def random_key_sheet(rng, day, num_pairs=10, reflectors=('B', 'C'),
+                     rotor_types=ROTOR_TYPES):
+    """
+    Generates the settings for one day.
+
+    Arguments:
+        rng (random.Random): Source of randomness.
+        day (int): Number of the day.
+        num_pairs (int): Number of plugboard pairs (up to 13).
+        reflectors (lst): Reflectors to choose from.
+        rotor_types (lst): Rotor types to choose three different ones from.
+
+    Returns:
+        key_sheet (KeySheet): The day's settings.
+    """
+    if not 0 <= num_pairs <= 13:
+        raise ValueError('Number of plugboard pairs must be from 0 to 13')
+    letters = rng.sample(string.ascii_uppercase, 2 * num_pairs)
+    steckered_pairing = ' '.join(letters[i] + letters[i + 1]
+                                 for i in range(0, len(letters), 2))
+    return KeySheet(day, tuple(rng.sample(list(rotor_types), 3)),
+                    random_letters(rng, 3), rng.choice(list(reflectors)),
+                    steckered_pairing)
+
+
+def random_letters(rng, length):
+    """
+    A string of random upper case letters.
+    """
+    return ''.join(rng.choice(string.ascii_uppercase) for _ in range(length))
+
+
+def random_plaintext(rng, min_words=5, max_words=40):
+    """
+    A random plaintext of vocabulary words, with "X" in place of full stops
+    and no spaces, as was the convention.
+    """
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        words.append(rng.choice(WORDS))
+        if rng.random() < 0.15:
+            words.append('X')
+
+    return ''.join(words)
+
+
+def generate_messages(key_sheet, num_messages, seed, doubled=False):
+    """
+    Generates and encrypts messages for one day.
+
+    Arguments:
+        key_sheet (KeySheet): The day's settings.
+        num_messages (int): Number of messages to generate.
+        seed (str): Seed for the messages.
+        doubled (bool): Whether to type the message key twice.
+
+    Returns:
+        messages (lst): One dictionary per message with the day, ground
+                        setting, encrypted message key, plaintext, message
+                        key and ciphertext.
+    """
+    rng = random.Random(seed)
+    wiring = MachineWiring.shared(key_sheet.rotor_types,
+                                  key_sheet.ring_settings,
+                                  key_sheet.reflector_mapping,
+                                  key_sheet.steckered_pairing)
+    messages = []
+    for _ in range(num_messages):
+        ground_setting = random_letters(rng, 3)
+        message_key = random_letters(rng, 3)
+        encrypted_key = wiring.encrypt(message_key * (2 if doubled else 1),
+                                       text_to_numbers(ground_setting))
+        plaintext = random_plaintext(rng)
+        ciphertext = wiring.encrypt(plaintext, text_to_numbers(message_key))
+        messages.append({'day': key_sheet.day,
+                         'ground_setting': ground_setting,
+                         'encrypted_key': encrypted_key,
+                         'message_key': message_key,
+                         'plaintext': plaintext,
+                         'ciphertext': ciphertext})
+
+    return messages
+
+
+def _generate_chunk(args):
+    """
+    Generates a chunk of a day's messages as JSON lines.
+    """
+    key_sheet, num_messages, seed, doubled = args
+    return ''.join(json.dumps(message) + '\n' for message in
+                   generate_messages(key_sheet, num_messages, seed, doubled))
+
+
+def generate_corpus(path, num_days, messages_per_day, seed=0, num_pairs=10,
+                    doubled=False, jobs=1, chunk_size=10000,
+                    key_sheet_path=None):
+    """
+    Generates a corpus of messages over a number of days and writes it to a
+    file as it goes.
+
+    Arguments:
+        path (str): File to write messages to, as JSON lines.
+        num_days (int): Number of days of traffic.
+        messages_per_day (int): Number of messages each day.
+        seed (int): Seed for the whole corpus.
+        num_pairs (int): Number of plugboard pairs each day.
+        doubled (bool): Whether message keys are typed twice.
+        jobs (int): Number of worker processes.
+        chunk_size (int): Number of messages generated per chunk of work.
+        key_sheet_path (str): File to write the key sheets to, as JSON
+                              lines. If None, they aren't written.
+
+    Returns:
+        key_sheets (lst): The key sheet of each day.
+    """
+    rng = random.Random(seed)
+    key_sheets = [random_key_sheet(rng, day, num_pairs)
+                  for day in range(num_days)]
+    if key_sheet_path is not None:
+        with open(key_sheet_path, 'w') as key_sheet_file:
+            for key_sheet in key_sheets:
+                key_sheet_file.write(json.dumps(key_sheet._asdict()) + '\n')
+
+    chunks = [(key_sheet, min(chunk_size, messages_per_day - start),
+               f'{seed}-{key_sheet.day}-{start}', doubled)
+              for key_sheet in key_sheets
+              for start in range(0, messages_per_day, chunk_size)]
+    with open(path, 'w') as corpus_file:
+        if jobs > 1:
+            with Pool(jobs) as pool:
+                for lines in pool.imap(_generate_chunk, chunks):
+                    corpus_file.write(lines)
+        else:
+            for chunk in chunks:
+                corpus_file.write(_generate_chunk(chunk))
+
+    return key_sheets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic Enigma traffic.')
+    parser.add_argument('path')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--messages-per-day', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pairs', type=int, default=10)
+    parser.add_argument('--doubled', action='store_true')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--key-sheets')
+    args = parser.parse_args()
+
+    generate_corpus(args.path, args.days, args.messages_per_day,
+                    seed=args.seed, num_pairs=args.pairs,
+                    doubled=args.doubled, jobs=args.jobs,
+                    key_sheet_path=args.key_sheets)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Zygalski sheet attack on doubled message key indicators.
+
+Between 1938 and 1940 each Enigma message began with a ground setting sent
+in the clear, followed by the message key typed twice and encrypted at that
+ground setting. When the same letter appears in the 1st and 4th, 2nd and 5th
+or 3rd and 6th places of the encrypted key (a "female"), the product of the
+two encryptions must have a fixed point, which is only possible at some
+machine settings.
+
+A Zygalski sheet marks, for one rotor order and one position of the
+left-most rotor, every position of the middle and right rotors where a
+female is possible. Each female of the day selects a sheet and a shift
+(from its ground setting), and only ring settings marked on every selected
+sheet survive. The plugboard can be ignored as it doesn't change whether the
+product of two encryptions has a fixed point.
+
+Sheets are held as 676-bit integers, one bit per middle and right rotor
+position, so stacking them is a handful of bitwise operations per female.
+
+Example:
+    survivors = surviving_settings([('QWE', 'ABCAXY'), ...])
+"""
+
+from itertools import permutations
+
+from enigma_machine import EnigmaMachine
+from key_search import rotor_tables, text_to_numbers, numbers_to_text
+
+# All 676 bits of a sheet.
+FULL_SHEET = (1 << 676) - 1
+# For detecting a zero byte in a 26 byte integer, see _has_zero_byte.
+_LOW_BYTES = int.from_bytes(b'\x01' * 26, 'big')
+_HIGH_BYTES = int.from_bytes(b'\x80' * 26, 'big')
+# Masks for turning a sheet's columns, see roll_sheet.
+_COLUMN_KEEP = [sum(((1 << (26 - shift)) - 1) << (26 * row)
+                    for row in range(26)) for shift in range(26)]
+_COLUMN_WRAP = [sum(((1 << shift) - 1) << (26 * row) for row in range(26))
+                for shift in range(26)]
+
+# Sheets by rotor order and reflector, see sheets_for.
+_SHEETS = {}
+
+
+def _has_zero_byte(value):
+    """
+    Whether any of the bytes of an integer below 2 ** 208 is zero, given
+    that none is 0x80 or above.
+    """
+    return (value - _LOW_BYTES) & ~value & _HIGH_BYTES != 0
+
+
+def roll_sheet(sheet, rows, columns):
+    """
+    Turns a sheet cyclically, moving the bit for row i, column j to row
+    i + rows, column j + columns.
+
+    Arguments:
+        sheet (int): 676-bit sheet, bit 26 * row + column.
+        rows (int): Rows to move by.
+        columns (int): Columns to move by.
+
+    Returns:
+        sheet (int): The moved sheet.
+    """
+    rows = rows % 26
+    columns = columns % 26
+    if rows:
+        sheet = ((sheet << (26 * rows)) | (sheet >> (676 - 26 * rows))) & \
+            FULL_SHEET
+    if columns:
+        sheet = ((sheet & _COLUMN_KEEP[columns]) << columns) | \
+            ((sheet >> (26 - columns)) & _COLUMN_WRAP[columns])
+
+    return sheet
+
+
+def sheets_for(rotor_types, reflector_mapping='B'):
+    """
+    Builds the Zygalski sheets for a rotor order.
+
+    Rather than running the machine for every setting, the reflector and
+    left-most two rotors are composed once per left and middle rotor
+    offset. The encryption at each right rotor offset then follows from two
+    byte translations, and whether two encryptions can give a female from a
+    single check for a zero byte.
+
+    The sheets are indexed by ring settings rather than positions: bit
+    26 * middle_ring + right_ring of sheets[pair][left_offset] is set if a
+    female at places pair and pair + 3 is possible with ring settings
+    middle_ring and right_ring and a ground setting of 'A' for the middle and
+    right rotors, where left_offset is the left-most ground setting minus its
+    ring setting. Other ground settings turn the sheet, see roll_sheet.
+
+    Arguments:
+        rotor_types (lst): Three rotor types, left-most first.
+        reflector_mapping (str): As for EnigmaMachine.
+
+    Returns:
+        sheets (lst): Three lists, one per pair of places, of 26 sheets.
+    """
+    key = (tuple(rotor_types), reflector_mapping)
+    if key in _SHEETS:
+        return _SHEETS[key]
+    if len(rotor_types) != 3:
+        raise ValueError('Zygalski sheets need a three rotor machine')
+    (left_forward, left_reverse, _), (middle_forward, middle_reverse, _), \
+        (right_forward, right_reverse, _) = \
+        [rotor_tables(rotor_type) for rotor_type in rotor_types]
+    reflector = EnigmaMachine.Reflector(reflector_mapping).wiring()
+    # Translation tables for the right-most rotor at each offset.
+    right_tables = [(bytes(right_forward[offset]) + bytes(230),
+                     bytes(right_reverse[offset]) + bytes(230))
+                    for offset in range(26)]
+    alphabet = bytes(range(26))
+
+    sheets = [[0] * 26 for _ in range(3)]
+    for left in range(26):
+        left_reflection = [left_reverse[left][reflector[
+            left_forward[left][number]]] for number in range(26)]
+        for middle in range(26):
+            reflection = bytes(middle_reverse[middle][left_reflection[
+                middle_forward[middle][number]]]
+                for number in range(26)) + bytes(230)
+            # The encryption at each right rotor offset, as an integer.
+            encryptions = []
+            for forward, reverse in right_tables:
+                encryption = alphabet.translate(forward).translate(
+                    reflection).translate(reverse)
+                encryptions.append(int.from_bytes(encryption, 'big'))
+            for right in range(26):
+                for pair in range(3):
+                    # Encryptions are involutions, so their product has a
+                    # fixed point exactly where they agree.
+                    if _has_zero_byte(encryptions[(right + pair + 1) % 26]
+                                      ^ encryptions[(right + pair + 4) % 26]):
+                        # Ring settings giving these offsets from ground
+                        # setting 'A'.
+                        bit = 26 * (-middle % 26) + (-right % 26)
+                        sheets[pair][left] |= 1 << bit
+    _SHEETS[key] = sheets
+
+    return sheets
+
+
+def females(indicators):
+    """
+    Finds the females in a day's indicators.
+
+    Arguments:
+        indicators (lst): List of (ground_setting, encrypted_key) tuples,
+                          where encrypted_key is the doubled message key
+                          encrypted at ground_setting.
+
+    Returns:
+        females (lst): List of (ground_setting, pair) tuples, ground_setting
+                       as a list of numbers, for each pair of places (0, 1 or
+                       2) where the encrypted key repeats a letter.
+    """
+    found = []
+    for ground_setting, encrypted_key in indicators:
+        encrypted_key = encrypted_key.upper()
+        if len(encrypted_key) != 6 or len(ground_setting) != 3:
+            raise ValueError('Indicators must be a three letter ground '
+                             'setting and six letter encrypted key')
+        for pair in range(3):
+            if encrypted_key[pair] == encrypted_key[pair + 3]:
+                found.append((text_to_numbers(ground_setting), pair))
+
+    return found
+
+
+def _turns_middle(notches, ground_setting):
+    """
+    Whether the middle or left-most rotor turns while the six letters of an
+    indicator are typed, which the sheets don't allow for.
+    """
+    positions = list(ground_setting)
+    for _ in range(6):
+        previous = positions[:2]
+        EnigmaMachine.step_positions(positions, notches)
+        if positions[:2] != previous:
+            return True
+
+    return False
+
+
+def stack_sheets(rotor_types, day_females, reflector_mapping='B'):
+    """
+    Stacks the sheets selected by a day's females for one rotor order.
+
+    Females whose indicator turned the middle rotor are left out, as the
+    sheets assume only the right-most rotor turns. Whether it turned only
+    depends on the ground setting, so this is known exactly.
+
+    Arguments:
+        rotor_types (lst): Three rotor types, left-most first.
+        day_females (lst): Females, as returned by females().
+        reflector_mapping (str): As for EnigmaMachine.
+
+    Returns:
+        ring_settings (lst): Ring settings consistent with every female.
+    """
+    sheets = sheets_for(rotor_types, reflector_mapping)
+    notches = [rotor_tables(rotor_type)[2] for rotor_type in rotor_types]
+    usable = [(ground_setting, pair) for ground_setting, pair in day_females
+              if not _turns_middle(notches, ground_setting)]
+    survivors = []
+    for left_ring in range(26):
+        stack = FULL_SHEET
+        for (left, middle, right), pair in usable:
+            stack &= roll_sheet(sheets[pair][(left - left_ring) % 26],
+                                middle, right)
+            if not stack:
+                break
+        while stack:
+            bit = stack & -stack
+            middle_ring, right_ring = divmod(bit.bit_length() - 1, 26)
+            survivors.append(numbers_to_text([left_ring, middle_ring,
+                                              right_ring]))
+            stack ^= bit
+
+    return survivors
+
+
+def surviving_settings(indicators, reflector_mapping='B', rotor_orders=None):
+    """
+    Runs the Zygalski sheet attack on a day's indicators.
+
+    Arguments:
+        indicators (lst): List of (ground_setting, encrypted_key) tuples.
+        reflector_mapping (str): As for EnigmaMachine.
+        rotor_orders (lst): Rotor orders to try. Defaults to all 60 orders of
+                            three of the rotors I - V.
+
+    Returns:
+        survivors (dict): Ring settings consistent with every female, by
+                          rotor order. Rotor orders with none are left out.
+    """
+    if rotor_orders is None:
+        rotor_orders = permutations(['I', 'II', 'III', 'IV', 'V'], 3)
+    day_females = females(indicators)
+    survivors = {}
+    for rotor_types in rotor_orders:
+        ring_settings = stack_sheets(rotor_types, day_females,
+                                     reflector_mapping)
+        if ring_settings:
+            survivors[tuple(rotor_types)] = ring_settings
+
+    return survivors